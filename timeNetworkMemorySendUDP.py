@@ -1,19 +1,82 @@
-import subprocess
+import time
+
+_PROCESS_START = time.perf_counter()  # 尽早记录，用于统计启动耗时
+
 import tkinter as tk
-import psutil
+from array import array
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 import ctypes
+import errno
+import select
 import sys
-from tkinter import messagebox, ttk, simpledialog
+from tkinter import messagebox
 from typing import List
-import winreg
 import socket
+import struct
 import threading
-import time
-from tkinter import messagebox, scrolledtext  # 导入 scrolledtext 模块
-import pystray
-from PIL import Image
 import os
+import queue
+import zlib
+# psutil / pystray / PIL / winreg / ttk / scrolledtext 等较重的模块改为首次使用时在函数内导入，
+# 并用 STARTUP_TRACE.importing() 计时，保证开机自启动时时钟最先显示
+# （保留静态 import 语句，PyInstaller 才能分析到这些依赖）
+
+
+class StartupTrace:
+    """记录启动各阶段及延迟导入的耗时，便于发现启动变慢的回归"""
+
+    def __init__(self, origin: float):
+        self.origin = origin  # 进程启动时刻（perf_counter）
+        self.last_mark = origin
+        self.records = []  # (类别, 名称, 相对启动的开始时间, 耗时)，单位秒
+        self.lock = threading.Lock()
+
+    def _add(self, kind: str, name: str, start: float, elapsed: float):
+        with self.lock:
+            self.records.append((kind, name, start - self.origin, elapsed))
+
+    def mark(self, name: str, kind: str = "阶段"):
+        """记录从上一个标记到现在的耗时"""
+        now = time.perf_counter()
+        self._add(kind, name, self.last_mark, now - self.last_mark)
+        self.last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """统计一个初始化阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._add("阶段", name, start, end - start)
+            self.last_mark = end
+
+    @contextmanager
+    def importing(self, name: str):
+        """包住函数内的 import 语句，仅在首次导入时记录耗时"""
+        if name in sys.modules:
+            yield
+            return
+        start = time.perf_counter()
+        yield
+        self._add("导入", name, start, time.perf_counter() - start)
+
+    def report(self) -> str:
+        """生成按时间排序的耗时报告"""
+        with self.lock:
+            records = sorted(self.records, key=lambda r: r[2])
+        lines = [f"{'开始(ms)':>9} {'耗时(ms)':>9}  类别  名称"]
+        for kind, name, start, elapsed in records:
+            lines.append(f"{start * 1000:9.1f} {elapsed * 1000:9.1f}  {kind}  {name}")
+        return "\n".join(lines)
+
+
+STARTUP_TRACE = StartupTrace(_PROCESS_START)
+STARTUP_TRACE.mark("基础模块导入", "导入")
+
 
 # timeNetworkMemorySendUDP.py
 class MemoryManager:
@@ -72,24 +135,2003 @@ class MemoryManager:
                 f"当前总分配的内存大小：\n{self.total_size} 字节 ({self._bytes_to_mb(self.total_size)} MB)")
 
 
-class ClockWindow(tk.Tk):
+class UIDispatcher:
+    """线程安全的界面更新队列：任意线程投递，Tk 主线程按帧批量刷新
+
+    同一个控件只保留最新一次投递的参数（后到的覆盖先到的），高频率投递也不会堆积事件。
+    只在有待处理的更新时才安排下一帧，空闲时不占用定时器；其他线程投递时只调用一次
+    after 安排刷新（线程化的 Tcl 会把调用转交主线程），从不直接修改控件。
+    """
+
+    FRAME_MS = 33  # 每帧间隔（毫秒），约 30 帧/秒
+
+    def __init__(self, root: tk.Misc):
+        self.root = root
+        self.pending = {}  # 控件路径 -> (控件, 配置参数)
+        self.calls = []  # 待在主线程执行的 (函数, 参数)
+        self.lock = threading.Lock()
+        self.running = False
+        self.scheduled = False  # 是否已安排了下一帧
+
+    def post(self, widget, **options):
+        """投递一次控件更新（可在任意线程调用）"""
+        if widget is None:
+            return
+        key = str(widget)
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                self.pending[key] = (widget, options)
+            else:
+                entry[1].update(options)
+        self._schedule(self.FRAME_MS)
+
+    def call(self, func, *args):
+        """在 Tk 主线程执行 func（可在任意线程调用，例如托盘菜单）"""
+        with self.lock:
+            self.calls.append((func, args))
+        self._schedule(0)
+
+    def start(self):
+        """在 Tk 主线程启动刷新"""
+        if not self.running:
+            self.running = True
+            if self.pending or self.calls:
+                self._schedule(self.FRAME_MS)
+
+    def stop(self):
+        """停止刷新并丢弃未处理的更新"""
+        self.running = False
+        with self.lock:
+            self.pending.clear()
+            self.calls.clear()
+
+    def _schedule(self, delay: int):
+        """安排一次刷新（已安排时不重复）"""
+        with self.lock:
+            if self.scheduled or not self.running:
+                return
+            self.scheduled = True
+        try:
+            self.root.after(delay, self._drain)
+        except (RuntimeError, tk.TclError):
+            with self.lock:
+                self.scheduled = False  # 主循环已结束或窗口已销毁
+
+    def _drain(self):
+        """取出本帧积累的全部更新并一次性应用（仅在 Tk 主线程执行）"""
+        with self.lock:
+            self.scheduled = False
+            if not self.running:
+                return
+            batch, self.pending = self.pending, {}
+            calls, self.calls = self.calls, []
+        for widget, options in batch.values():
+            try:
+                widget.config(**options)
+            except tk.TclError:
+                pass  # 控件已随窗口销毁
+        for func, args in calls:
+            func(*args)
+
+
+class AdaptiveSampler:
+    """网速自适应采样
+
+    上下行持续低于阈值时退避：界面每 IDLE_MS 才刷新一次，期间只以 IDLE_POLL_MS 廉价地轮询计数器；
+    检测到速率突变时立即切到快速采样（FAST_MS）并保持一段时间，其余时候按用户设置的刷新间隔采样。
+    界面显示每个刷新周期的平均速率和各次采样中的峰值，峰值的分辨率就是当时的采样间隔
+    （快速 FAST_MS、退避 IDLE_POLL_MS），慢速刷新也不会把短暂的突发平均掉。
+    关闭自适应时每次都按刷新间隔采样，与原来的行为一致。
+    """
+
+    FAST_MS = 100
+    IDLE_MS = 5000  # 退避时的界面刷新间隔
+    IDLE_POLL_MS = 500  # 退避时轮询计数器的间隔，决定能发现的最短突发
+    IDLE_THRESHOLD = 16 * 1024  # 上下行都低于此速率（字节/秒）视为空闲
+    IDLE_AFTER = 10.0  # 连续空闲多少秒后退避
+    CHANGE_RATIO = 0.5  # 速率相对上次采样变化超过此比例视为突变
+    FAST_HOLD = 3.0  # 突变后保持快速采样的秒数
+
+    def __init__(self, refresh_ms: int, adaptive: bool = True):
+        self.refresh_ms = refresh_ms
+        self.adaptive = adaptive
+        self.backed_off = False
+        self.last_rates = None
+        self.fast_until = 0.0
+        self.idle_since = None
+        self.window_start = None  # 本次显示周期的开始时刻
+        self.window_bytes = [0, 0]
+        self.peaks = [0.0, 0.0]
+
+    def sample(self, now: float, elapsed: float, sent: int, received: int):
+        """记录一次采样（elapsed 秒内上/下行的字节数），返回 (下次采样延迟毫秒, 显示值或 None)
+
+        显示值为 (上行均值, 下行均值, 上行峰值, 下行峰值)，单位字节/秒，每个显示周期给出一次。
+        """
+        rates = (sent / elapsed, received / elapsed) if elapsed > 0 else (0.0, 0.0)
+        if self.window_start is None:
+            self.window_start = now - elapsed
+        self.window_bytes[0] += sent
+        self.window_bytes[1] += received
+        self.peaks = [max(peak, rate) for peak, rate in zip(self.peaks, rates)]
+        delay = self._next_delay(now, rates)
+        self.last_rates = rates
+
+        period = max(self.IDLE_MS, self.refresh_ms) if self.backed_off else self.refresh_ms
+        window = now - self.window_start
+        # 下次采样不早于显示周期时每次都显示；否则攒够一个显示周期再显示
+        if delay < period and window * 1000 < period * 0.9:
+            return delay, None
+        display = (self.window_bytes[0] / window, self.window_bytes[1] / window) if window > 0 else rates
+        display += tuple(self.peaks)
+        self.window_start = now
+        self.window_bytes = [0, 0]
+        self.peaks = [0.0, 0.0]
+        return delay, display
+
+    def _next_delay(self, now: float, rates) -> int:
+        self.backed_off = False
+        if not self.adaptive:
+            return self.refresh_ms
+        last = self.last_rates
+        if last is not None and any(abs(rate - old) > max(old * self.CHANGE_RATIO, self.IDLE_THRESHOLD)
+                                    for rate, old in zip(rates, last)):
+            self.fast_until = now + self.FAST_HOLD
+        if max(rates) < self.IDLE_THRESHOLD:
+            if self.idle_since is None:
+                self.idle_since = now
+        else:
+            self.idle_since = None
+        if now < self.fast_until:
+            return min(self.FAST_MS, self.refresh_ms)
+        if self.idle_since is not None and now - self.idle_since >= self.IDLE_AFTER:
+            self.backed_off = True
+            return min(self.IDLE_POLL_MS, self.refresh_ms)
+        return self.refresh_ms
+
+
+class SessionRecorder:
+    """把网速、发送计数、内存占用等指标追加写入定长二进制日志
+
+    文件头 16 字节（魔数 + 记录长度），之后每条记录固定 32 字节：
+    时间戳(double) + 类型(uint8) + 两个数值(double)。
+    写入先进缓冲区，攒满或超时后一次落盘；文件超过上限时自动轮转。
+    """
+
+    MAGIC = b"TNMSREC1"
+    HEADER = struct.Struct("<8sI4x")
+    RECORD = struct.Struct("<dB7xdd")
+
+    KIND_NETWORK = 1  # a=上传 字节/秒，b=下载 字节/秒
+    KIND_SENDER = 2  # a=累计发送字节，b=发送速率 bit/s
+    KIND_MEMORY = 3  # a=总分配字节，b=内存块数量
+    KIND_RTT = 4  # a=RTT p50 微秒，b=RTT p99 微秒
+    # 类型 -> (a 的序列名, b 的序列名)，分析时使用
+    SERIES = {
+        KIND_NETWORK: ("net_up", "net_down"),
+        KIND_SENDER: ("sender_bytes", "sender_rate"),
+        KIND_MEMORY: ("memory_bytes", "memory_blocks"),
+        KIND_RTT: ("rtt_p50", "rtt_p99"),
+    }
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, backups: int = 5,
+                 buffer_records: int = 256, flush_interval: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes  # 单个文件上限（字节）
+        self.backups = backups  # 保留的轮转文件个数
+        self.flush_interval = flush_interval  # 最长落盘间隔（秒）
+        self.buffer = bytearray(self.RECORD.size * buffer_records)
+        self.offset = 0  # 缓冲区已用字节
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.file = None
+        self._open_file()
+
+    def _open_file(self):
+        """打开（或新建）日志文件，新文件写入文件头"""
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(self.HEADER.pack(self.MAGIC, self.RECORD.size))
+
+    def record(self, kind: int, a: float, b: float = 0.0):
+        """追加一条记录（可在任意线程调用，已关闭时忽略）"""
+        with self.lock:
+            if self.file is None:
+                return
+            self.RECORD.pack_into(self.buffer, self.offset, time.time(), kind, a, b)
+            self.offset += self.RECORD.size
+            if (self.offset == len(self.buffer)
+                    or time.monotonic() - self.last_flush >= self.flush_interval):
+                self._flush()
+
+    def flush_due(self):
+        """距上次落盘超过间隔时把缓冲写入（由定时器调用，没有新记录时也能按时落盘）"""
+        with self.lock:
+            if self.file is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        """把缓冲区写入文件，必要时轮转（调用方需持有锁）"""
+        if self.offset:
+            if self.file.tell() + self.offset > self.max_bytes:
+                self._rotate()
+            self.file.write(memoryview(self.buffer)[:self.offset])
+            self.file.flush()
+            self.offset = 0
+        self.last_flush = time.monotonic()
+
+    def _rotate(self):
+        """session.bin -> session.bin.1 -> session.bin.2 ...，超出保留个数的删除"""
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{index}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open_file()
+
+    def close(self):
+        """落盘并关闭文件"""
+        with self.lock:
+            if self.file is None:
+                return
+            self._flush()
+            self.file.close()
+            self.file = None
+
+
+def _session_files(path: str) -> List[str]:
+    """按时间先后返回日志及其轮转文件（最旧的在前）"""
+    files = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        files.append(f"{path}.{index}")
+        index += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def _load_session(path: str):
+    """内存映射读取日志，返回 (时间, 类型, a, b) 四列
+
+    安装了 numpy 时直接在映射上构造结构化数组，否则退回 array 模块逐条解析。
+    """
+    import mmap
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    header_size = SessionRecorder.HEADER.size
+    record_size = SessionRecorder.RECORD.size
+    columns = [[], [], [], []]
+    for file_path in _session_files(path):
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= header_size:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, size = SessionRecorder.HEADER.unpack_from(mm, 0)
+                if magic != SessionRecorder.MAGIC or size != record_size:
+                    raise ValueError(f"不是有效的会话记录文件：{file_path}")
+                count = (len(mm) - header_size) // record_size
+                if np is not None:
+                    dtype = np.dtype({"names": ["t", "kind", "a", "b"],
+                                      "formats": ["<f8", "u1", "<f8", "<f8"],
+                                      "offsets": [0, 8, 16, 24], "itemsize": record_size})
+                    data = np.frombuffer(mm, dtype=dtype, count=count, offset=header_size)
+                    for column, name in zip(columns, ("t", "kind", "a", "b")):
+                        column.append(data[name].copy())  # 复制出来才能关闭映射
+                    del data
+                else:
+                    parts = [array(code) for code in "dBdd"]
+                    view = memoryview(mm)[header_size:header_size + count * record_size]
+                    for t, kind, a, b in SessionRecorder.RECORD.iter_unpack(view):
+                        parts[0].append(t)
+                        parts[1].append(kind)
+                        parts[2].append(a)
+                        parts[3].append(b)
+                    view.release()
+                    for column, part in zip(columns, parts):
+                        column.append(part)
+    if np is not None:
+        return tuple(np.concatenate(c) if c else np.empty(0) for c in columns)
+    merged = []
+    for column, code in zip(columns, "dBdd"):
+        values = array(code)
+        for part in column:
+            values.extend(part)
+        merged.append(values)
+    return tuple(merged)
+
+
+def _series_summary(times, values, threshold=None) -> dict:
+    """计算一组序列的统计值：均值、百分位、峰值及其时间、不低于阈值的时长"""
+    if hasattr(values, "argmax"):
+        import numpy as np
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        peak_index = int(values.argmax())
+        summary = {"count": int(values.size), "mean": float(values.mean()),
+                   "p50": float(p50), "p90": float(p90), "p99": float(p99),
+                   "max": float(values[peak_index]), "max_time": float(times[peak_index])}
+        if threshold is not None:
+            summary["time_above"] = float(np.diff(times)[values[:-1] >= threshold].sum())
+        return summary
+
+    ordered = sorted(values)
+    count = len(ordered)
+
+    def percentile(p):
+        # 与 numpy 默认的线性插值保持一致
+        pos = (count - 1) * p / 100
+        low = int(pos)
+        high = min(low + 1, count - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    peak_index = max(range(count), key=values.__getitem__)
+    summary = {"count": count, "mean": sum(values) / count,
+               "p50": percentile(50), "p90": percentile(90), "p99": percentile(99),
+               "max": values[peak_index], "max_time": times[peak_index]}
+    if threshold is not None:
+        summary["time_above"] = sum(times[i + 1] - times[i]
+                                    for i in range(count - 1) if values[i] >= threshold)
+    return summary
+
+
+def analyze_session(path: str, thresholds: dict = None) -> dict:
+    """离线分析会话记录，返回 {序列名: 统计值}
+
+    thresholds: {序列名: 阈值}，额外统计序列值不低于阈值的累计时长（秒）
+    """
+    thresholds = thresholds or {}
+    times, kinds, values_a, values_b = _load_session(path)
+    result = {}
+    for kind, names in SessionRecorder.SERIES.items():
+        if hasattr(kinds, "argmax"):
+            mask = kinds == kind
+            if not mask.any():
+                continue
+            series_times = times[mask]
+            series_values = (values_a[mask], values_b[mask])
+        else:
+            indexes = [i for i, k in enumerate(kinds) if k == kind]
+            if not indexes:
+                continue
+            series_times = [times[i] for i in indexes]
+            series_values = ([values_a[i] for i in indexes], [values_b[i] for i in indexes])
+        for name, values in zip(names, series_values):
+            result[name] = _series_summary(series_times, values, thresholds.get(name))
+    return result
+
+
+def analyze_main(argv: List[str]) -> int:
+    """命令行入口：--analyze <文件> [--threshold 序列名=阈值 ...]"""
+    import argparse
+    series_names = [name for names in SessionRecorder.SERIES.values() for name in names]
+    parser = argparse.ArgumentParser(prog="timeNetworkMemorySendUDP --analyze",
+                                     description="离线分析会话记录文件")
+    parser.add_argument("path", help="会话记录文件（自动包含轮转出的 .1 .2 ...）")
+    parser.add_argument("--threshold", action="append", default=[], metavar="序列名=阈值",
+                        help="统计不低于阈值的时长，序列名：" + ", ".join(series_names))
+    args = parser.parse_args(argv)
+    thresholds = {}
+    for item in args.threshold:
+        name, _, value = item.partition("=")
+        if name not in series_names:
+            parser.error(f"未知的序列名：{name}")
+        thresholds[name] = float(value)
+
+    start = time.perf_counter()
+    result = analyze_session(args.path, thresholds)
+    elapsed = time.perf_counter() - start
+    if not result:
+        print("文件中没有记录")
+        return 1
+    for name, summary in result.items():
+        peak_at = datetime.fromtimestamp(summary["max_time"]).strftime("%Y-%m-%d %H:%M:%S")
+        line = (f"{name:14} 条数={summary['count']:<8} 均值={summary['mean']:.2f} "
+                f"p50={summary['p50']:.2f} p90={summary['p90']:.2f} p99={summary['p99']:.2f} "
+                f"峰值={summary['max']:.2f} ({peak_at})")
+        if "time_above" in summary:
+            line += f" 超阈值时长={summary['time_above']:.1f}s"
+        print(line)
+    print(f"分析耗时：{elapsed:.2f} 秒")
+    return 0
+
+
+class LoopMonitor:
+    """Tk 事件循环卡顿监控
+
+    安装后替换 tk.Misc.after、tk.Menu.add_command 与 tk.Misc._register：
+    定时回调和菜单命令按名称计时，并用 “实际触发时间 - 预定触发时间” 衡量事件循环的延迟；
+    其余所有 Python 回调（按钮/复选框命令、bind 事件处理等）都经过 _register，按 __qualname__ 计时。
+    安装之前已创建的控件的回调不计时。只在 Tk 主线程使用。
+    """
+
+    AFTER_CALLIT = "Misc.after.<locals>.callit"  # tkinter 的 after 注册的包装函数，已由 after 计时
+
+    SAMPLES = 1024  # 每个回调保留的最近耗时样本数，用于估算 p99
+    LAG_NAME = "(事件循环延迟)"
+
+    def __init__(self):
+        self.stats = {}  # 名称 -> [次数, 总耗时, 最大耗时, 最近样本]，单位秒
+        self.original_after = None
+        self.original_add_command = None
+        self.original_register = None
+
+    @property
+    def installed(self) -> bool:
+        return self.original_after is not None
+
+    def install(self):
+        """开始为定时回调和菜单命令计时"""
+        if self.installed:
+            return
+        monitor = self
+        original_after = self.original_after = tk.Misc.after
+        original_add_command = self.original_add_command = tk.Menu.add_command
+        original_register = self.original_register = tk.Misc._register
+
+        def after(widget, ms, func=None, *args):
+            if func is None:
+                return original_after(widget, ms)
+            delay = 0 if ms == "idle" else int(ms) / 1000
+            due = time.perf_counter() + delay
+            name = getattr(func, "__qualname__", type(func).__name__)
+
+            def timed():
+                monitor.record(monitor.LAG_NAME, max(0.0, time.perf_counter() - due))
+                monitor.call(name, func, *args)
+            timed.__name__ = getattr(func, "__name__", name)
+            return original_after(widget, ms, timed)
+
+        def add_command(menu, cnf=None, **kw):
+            command = kw.get("command")
+            if callable(command):
+                kw["command"] = monitor.wrap(f"菜单:{kw.get('label', '')}", command)
+            return original_add_command(menu, cnf or {}, **kw)
+
+        def register(widget, func, subst=None, needcleanup=1):
+            name = getattr(func, "__qualname__", type(func).__name__)
+            if not getattr(func, "loop_monitor_timed", False) and name != monitor.AFTER_CALLIT:
+                func = monitor.wrap(name, func)
+            return original_register(widget, func, subst, needcleanup)
+
+        tk.Misc.after = after
+        tk.Menu.add_command = add_command
+        tk.Misc._register = register
+
+    def uninstall(self):
+        """恢复原始方法（已排队的回调仍会计时一次）"""
+        if not self.installed:
+            return
+        tk.Misc.after = self.original_after
+        tk.Menu.add_command = self.original_add_command
+        tk.Misc._register = self.original_register
+        self.original_after = None
+        self.original_add_command = None
+        self.original_register = None
+
+    def wrap(self, name: str, func):
+        """返回带计时的回调"""
+        def timed(*args):
+            return self.call(name, func, *args)
+        timed.__name__ = getattr(func, "__name__", "timed")  # _register 用它拼 Tcl 命令名
+        timed.loop_monitor_timed = True  # 已计时，_register 不再重复包装
+        return timed
+
+    def call(self, name: str, func, *args):
+        """调用回调并记录耗时"""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, elapsed: float):
+        """记录一次耗时样本"""
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = [0, 0.0, 0.0, deque(maxlen=self.SAMPLES)]
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+        entry[3].append(elapsed)
+
+    def reset(self):
+        """清空统计"""
+        self.stats.clear()
+
+    def summary(self):
+        """返回 [(名称, 次数, 平均, p99, 最大)]，按最大耗时降序，单位毫秒"""
+        rows = []
+        for name, (count, total, peak, samples) in self.stats.items():
+            ordered = sorted(samples)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            rows.append((name, count, total / count * 1000, p99 * 1000, peak * 1000))
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows
+
+    def report(self, top: int = None) -> str:
+        """生成文本报告（事件循环延迟置顶，其余按最大耗时排序）"""
+        rows = self.summary()
+        lag = [row for row in rows if row[0] == self.LAG_NAME]
+        handlers = [row for row in rows if row[0] != self.LAG_NAME][:top]
+        lines = [f"{'次数':>7} {'平均ms':>8} {'p99ms':>8} {'最大ms':>8}  回调"]
+        for name, count, mean, p99, peak in lag + handlers:
+            lines.append(f"{count:7d} {mean:8.1f} {p99:8.1f} {peak:8.1f}  {name}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """低开销的采样分析器：定时抓取所有线程的调用栈，输出 collapsed-stack 格式
+
+    输出每行形如 “线程名;外层函数 (文件:行);...;内层函数 (文件:行) 次数”，
+    可直接交给 flamegraph.pl / speedscope 等工具生成火焰图。
+    采样本身的耗时会被统计，超过目标占比时自动放大采样间隔。
+    """
+
+    TARGET_OVERHEAD = 0.03  # 采样耗时占墙钟时间的目标上限
+    MAX_INTERVAL = 0.1  # 采样间隔上限（秒）
+
+    def __init__(self, path: str, duration: float, interval: float = 0.005):
+        self.path = path
+        self.duration = duration  # 采样时长（秒）
+        self.interval = interval  # 当前采样间隔（秒）
+        self.counts = {}  # (线程名, ((代码对象, 行号), ...)) -> 次数
+        self.samples = 0
+        self.busy = 0.0  # 采样累计耗时（秒）
+        self.elapsed = 0.0  # 实际采样墙钟时长（秒）
+        self.error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def overhead(self) -> float:
+        """采样开销占比"""
+        return self.busy / self.elapsed if self.elapsed > 0 else 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """提前结束采样（结果仍会写入文件）"""
+        self.stop_event.set()
+
+    def _run(self):
+        """采样线程主循环"""
+        own_id = threading.get_ident()
+        begin = time.perf_counter()
+        deadline = begin + self.duration
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            if start >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append((frame.f_code, frame.f_lineno))
+                    frame = frame.f_back
+                key = (names.get(thread_id, str(thread_id)), tuple(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+            self.busy += time.perf_counter() - start
+            self.elapsed = time.perf_counter() - begin
+            if self.overhead > self.TARGET_OVERHEAD and self.interval < self.MAX_INTERVAL:
+                self.interval = min(self.interval * 1.5, self.MAX_INTERVAL)
+            self.stop_event.wait(self.interval)
+        self.elapsed = time.perf_counter() - begin
+        try:
+            self._write()
+        except OSError as e:
+            self.error = e
+
+    def _write(self):
+        """写出 collapsed-stack 文件（外层在前，内层在后）"""
+        merged = {}
+        for (thread_name, stack), count in self.counts.items():
+            frames = [thread_name.replace(";", "_")]
+            for code, lineno in reversed(stack):
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})"
+                              .replace(";", "_"))
+            line = ";".join(frames)
+            merged[line] = merged.get(line, 0) + count
+        with open(self.path, "w", encoding="utf-8") as f:
+            for line, count in sorted(merged.items()):
+                f.write(f"{line} {count}\n")
+
+
+class LatencyHistogram:
+    """对数-线性分桶的延迟直方图（HDR 风格），内存固定
+
+    数值单位为微秒。小于 64 的值各占一个桶；之后每个 2 的幂区间均分为 32 个桶，
+    相对误差不超过约 3%。超过上限的值计入最后一个桶。
+    """
+
+    SUB_BITS = 6
+    SUB_HALF = 1 << (SUB_BITS - 1)  # 每个 2 的幂区间的桶数
+
+    def __init__(self, max_value_us: int = 60_000_000):
+        self.max_index = self._index(max_value_us)
+        self.counts = array("Q", bytes(8 * (self.max_index + 1)))
+        self.lock = threading.Lock()
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        """数值 -> 桶编号"""
+        shift = max(0, value.bit_length() - self.SUB_BITS)
+        return shift * self.SUB_HALF + (value >> shift)
+
+    def _upper(self, index: int) -> int:
+        """桶编号 -> 该桶可表示的最大值"""
+        if index < 2 * self.SUB_HALF:
+            return index
+        shift = index // self.SUB_HALF - 1
+        return ((index - shift * self.SUB_HALF + 1) << shift) - 1
+
+    def record(self, value_us: int):
+        """记录一个延迟值（微秒，可在任意线程调用）"""
+        value_us = max(0, int(value_us))
+        index = min(self._index(value_us), self.max_index)
+        with self.lock:
+            self.counts[index] += 1
+            if self.total == 0 or value_us < self.min:
+                self.min = value_us
+            if value_us > self.max:
+                self.max = value_us
+            self.total += 1
+
+    def percentile(self, p: float) -> int:
+        """返回第 p 百分位的延迟（微秒），无数据时为 0"""
+        with self.lock:
+            if self.total == 0:
+                return 0
+            target = max(1, -(-self.total * p // 100))  # 向上取整
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return min(self._upper(index), self.max)
+            return self.max
+
+    def reset(self):
+        with self.lock:
+            self.counts = array("Q", bytes(8 * (self.max_index + 1)))
+            self.total = 0
+            self.min = 0
+            self.max = 0
+
+    def summary(self) -> str:
+        """p50/p90/p99/p99.9/max 的简短文本（毫秒）"""
+        values = [self.percentile(p) for p in (50, 90, 99, 99.9)] + [self.max]
+        return " ".join(f"{label}={value / 1000:.2f}"
+                        for label, value in zip(("p50", "p90", "p99", "p99.9", "max"), values))
+
+
+class SocketTuning:
+    """套接字调优参数，发送端和接收端共用
+
+    UDP 发送/接收、TCP 各流及接收端、RTT 探测与回显端的套接字都会应用；非阻塞只用于 UDP 发送。
+    """
+
+    def __init__(self, sndbuf: int = 0, rcvbuf: int = 0, dscp: int = 0, nonblocking: bool = False,
+                 busy_poll_us: int = 0):
+        self.sndbuf = sndbuf  # SO_SNDBUF（字节），0 表示系统默认
+        self.rcvbuf = rcvbuf  # SO_RCVBUF（字节），0 表示系统默认
+        self.dscp = dscp  # DSCP 值 0~63，写入 IP_TOS 的高 6 位
+        self.nonblocking = nonblocking  # UDP 非阻塞发送：缓冲区满时计数并等待可写，而不是报错中止
+        self.busy_poll_us = busy_poll_us  # SO_BUSY_POLL（微秒，仅 Linux），0 表示关闭
+
+    def key(self):
+        return self.sndbuf, self.rcvbuf, self.dscp, self.nonblocking, self.busy_poll_us
+
+    def apply(self, sock: socket.socket) -> List[str]:
+        """把参数设置到套接字上（不含阻塞模式），返回系统不支持而跳过的选项名"""
+        busy_poll = getattr(socket, "SO_BUSY_POLL", 46 if sys.platform.startswith("linux") else None)
+        options = []
+        if self.sndbuf:
+            options.append(("SO_SNDBUF", socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf))
+        if self.rcvbuf:
+            options.append(("SO_RCVBUF", socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf))
+        if self.dscp:
+            options.append(("IP_TOS", socket.IPPROTO_IP, getattr(socket, "IP_TOS", None), self.dscp << 2))
+        if self.busy_poll_us:
+            options.append(("SO_BUSY_POLL", socket.SOL_SOCKET, busy_poll, self.busy_poll_us))
+        skipped = []
+        for name, level, option, value in options:
+            if option is None:
+                skipped.append(name)
+                continue
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError:
+                skipped.append(name)
+        return skipped
+
+
+# 发送缓冲区满时 sendto 可能返回的错误码（非阻塞时为 EAGAIN，UDP 还可能是 ENOBUFS；
+# Windows 上 errno 是 WSA 错误码）
+_BACKPRESSURE_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS,
+                        getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK),
+                        getattr(errno, "WSAENOBUFS", errno.ENOBUFS)}
+
+
+def read_udp_snmp():
+    """读取 Linux /proc/net/snmp 中的 UDP 计数器，其他系统返回 None"""
+    try:
+        with open("/proc/net/snmp") as f:
+            lines = [line.split() for line in f if line.startswith("Udp:")]
+    except OSError:
+        return None
+    if len(lines) < 2:
+        return None
+    return {name: int(value) for name, value in zip(lines[0][1:], lines[1][1:])}
+
+
+def format_udp_snmp_delta(base, current) -> str:
+    """格式化两次 UDP 计数器之间的丢包相关增量"""
+    if not base or not current:
+        return ""
+    return " ".join(f"{name} +{current.get(name, 0) - base.get(name, 0)}"
+                    for name in ("InErrors", "RcvbufErrors", "SndbufErrors"))
+
+
+class UdpEchoResponder:
+    """本机 UDP 回显端：收到什么就原样发回去"""
+
+    PORT = 12346
+
+    def __init__(self, port: int = PORT, tuning: SocketTuning = None):
+        self.port = port
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        (tuning or SocketTuning()).apply(self.sock)
+        self.sock.bind(("0.0.0.0", port))
+        self.sock.settimeout(0.5)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="UdpEchoResponder", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        buffer = bytearray(65535)
+        while self.running:
+            try:
+                size, address = self.sock.recvfrom_into(buffer)
+                self.sock.sendto(memoryview(buffer)[:size], address)
+            except socket.timeout:
+                continue
+            except ConnectionResetError:
+                continue  # Windows 上对端已退出（ICMP 端口不可达）时下一次 recvfrom 报错，忽略
+            except OSError:
+                if not self.running or self.sock.fileno() == -1:
+                    break  # 套接字已关闭
+
+        self.sock.close()
+
+    def stop(self):
+        """停止回显并等待端口释放，便于马上重新开始"""
+        self.running = False
+        try:
+            # 发一个空包唤醒阻塞在 recvfrom 上的线程
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as wake:
+                wake.sendto(b"", ("127.0.0.1", self.port))
+        except OSError:
+            pass
+        self.thread.join(timeout=1.0)
+
+
+class RttProbeClient:
+    """按固定频率发送带时间戳的探测包，统计往返时延
+
+    探测包为 “序号(uint32) + 发送时刻(perf_counter_ns)”，补齐到 PROBE_SIZE 字节，
+    回显端原样返回后用接收时刻相减得到 RTT，记入 LatencyHistogram。
+    """
+
+    PROBE = struct.Struct("<IQ")
+    PROBE_SIZE = 64
+
+    def __init__(self, ip: str, port: int, rate: float, tuning: SocketTuning = None):
+        self.address = (ip, port)
+        self.rate = rate  # 每秒探测次数
+        self.histogram = LatencyHistogram()
+        self.interval_histogram = LatencyHistogram()  # 由使用方按采样间隔清零，统计每段时间的延迟分布
+        self.sent = 0
+        self.received = 0
+        self.running = True
+        self.active = threading.Event()  # 清除时暂停探测
+        self.active.set()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        (tuning or SocketTuning()).apply(self.sock)
+        self.sock.settimeout(0.5)
+        threading.Thread(target=self._send_loop, name="RttProbeSender", daemon=True).start()
+        threading.Thread(target=self._recv_loop, name="RttProbeReceiver", daemon=True).start()
+
+    @property
+    def lost(self) -> int:
+        """已发送但未收到回显的探测数（包括仍在路上的）"""
+        return max(0, self.sent - self.received)
+
+    def _send_loop(self):
+        packet = bytearray(self.PROBE_SIZE)
+        period = 1.0 / self.rate
+        next_send = time.perf_counter()
+        while self.running:
+            if not self.active.is_set():
+                self.active.wait()
+                next_send = time.perf_counter()
+                continue
+            self.PROBE.pack_into(packet, 0, self.sent & 0xFFFFFFFF, time.perf_counter_ns())
+            try:
+                self.sock.sendto(packet, self.address)
+            except OSError:
+                if not self.running:
+                    break
+            else:
+                self.sent += 1
+            next_send += period
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_send = time.perf_counter()  # 跟不上时不追赶，避免突发
+
+    def _recv_loop(self):
+        buffer = bytearray(self.PROBE_SIZE)
+        while self.running:
+            try:
+                size = self.sock.recv_into(buffer)
+            except socket.timeout:
+                continue
+            except ConnectionResetError:
+                continue  # Windows 上回显端尚未启动（ICMP 端口不可达）时报错，忽略并继续等待
+            except OSError:
+                if not self.running or self.sock.fileno() == -1:
+                    break  # stop() 已关闭套接字
+                continue
+            now = time.perf_counter_ns()
+            if size < self.PROBE.size:
+                continue
+            _, sent_ns = self.PROBE.unpack_from(buffer)
+            self.received += 1
+            self.histogram.record((now - sent_ns) // 1000)
+            self.interval_histogram.record((now - sent_ns) // 1000)
+
+    def pause(self):
+        self.active.clear()
+
+    def resume(self):
+        self.active.set()
+
+    def stop(self):
+        self.running = False
+        self.active.set()
+        self.sock.close()
+
+
+def tcp_retransmits(sock: socket.socket):
+    """读取 TCP_INFO 中的累计重传段数（仅 Linux 提供），不支持时返回 None"""
+    if not hasattr(socket, "TCP_INFO"):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+    except OSError:
+        return None
+    if len(info) < 104:
+        return None
+    return struct.unpack_from("=I", info, 100)[0]  # tcpi_total_retrans
+
+
+class TcpSink:
+    """本机 TCP 接收端：接受任意多个连接，读到的数据直接丢弃，只做计数"""
+
+    PORT = 12347
+    RECV_SIZE = 256 * 1024
+
+    def __init__(self, port: int = PORT, tuning: SocketTuning = None):
+        self.port = port
+        self.tuning = tuning or SocketTuning()
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.running = True
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if os.name != "nt":
+            # Windows 上 SO_REUSEADDR 允许抢占端口，不设置
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tuning.apply(self.listener)  # 缓冲区大小须在 listen 前设置，由 accept 的连接继承
+        self.listener.bind(("0.0.0.0", port))
+        self.listener.listen(64)
+        self.listener.settimeout(0.5)
+        self.thread = threading.Thread(target=self._accept_loop, name="TcpSink", daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._recv_loop, args=(conn,), name="TcpSinkConn", daemon=True).start()
+        self.listener.close()
+
+    def _recv_loop(self, conn: socket.socket):
+        buffer = bytearray(self.RECV_SIZE)
+        self.tuning.apply(conn)  # DSCP、忙轮询不一定随 accept 继承，再设一次
+        conn.settimeout(0.5)
+        with conn:
+            while self.running:
+                try:
+                    size = conn.recv_into(buffer)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                if not size:
+                    break
+                with self.lock:
+                    self.bytes_received += size
+
+    def stop(self):
+        """停止接收并等待监听端口释放"""
+        self.running = False
+        try:
+            # 连一下自己，唤醒阻塞在 accept 上的线程
+            socket.create_connection(("127.0.0.1", self.port), timeout=0.2).close()
+        except OSError:
+            pass
+        self.thread.join(timeout=1.0)
+
+
+class TcpBulkSender:
+    """类似 iperf 的多流 TCP 发送端
+
+    所有流共用一块预分配的只读缓冲区：sendall 方式直接发送其 memoryview，
+    sendfile 方式每条流各有一个内存映射的临时文件（内容相同），用 socket.sendfile 发送
+    （内核零拷贝，视系统支持；Windows 上退化为读文件再 send，因此各流不能共用一个文件对象）。
+    每个周期每条流发送 total_bytes / streams 字节，然后等待 interval_ms。
+    """
+
+    BLOCK_SIZE = 128 * 1024
+
+    def __init__(self, ip: str, port: int, streams: int, total_bytes: int, interval_ms: int,
+                 tuning: SocketTuning = None, method: str = "sendall", payload: str = "constant"):
+        self.address = (ip, port)
+        self.streams = streams
+        self.per_stream = max(1, total_bytes // streams)  # 每条流每周期发送的字节数
+        self.interval = interval_ms / 1000.0
+        self.tuning = tuning or SocketTuning()
+        self.method = method
+        self.stream_bytes = [0] * streams  # 每条流累计发送字节（各自线程写入）
+        self.sockets = [None] * streams
+        self.error = None
+        self.running = True
+        self.active = threading.Event()  # 清除时各流暂停发送，连接保持
+        self.active.set()
+        self.wake = threading.Event()  # 暂停/停止时置位，打断周期间的等待
+        self.block = PayloadPool.make_block(payload, self.BLOCK_SIZE)
+        self.block_files = []  # sendfile 方式下每条流的 (文件, 映射)
+        if method == "sendfile":
+            try:
+                for _ in range(streams):
+                    self.block_files.append(self._map_block())
+            except OSError:
+                self._close_block_files()
+                raise
+        self.threads = []
+        for index in range(streams):
+            thread = threading.Thread(target=self._stream_loop, args=(index,),
+                                      name=f"TcpBulkStream-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _map_block(self):
+        """创建一个内容为 block 的临时文件，通过内存映射写入，映射保持到发送结束"""
+        import mmap
+        import tempfile
+        block_file = tempfile.TemporaryFile()
+        try:
+            block_file.truncate(self.BLOCK_SIZE)
+            mapping = mmap.mmap(block_file.fileno(), self.BLOCK_SIZE)
+        except (OSError, ValueError) as e:
+            block_file.close()
+            raise OSError(f"无法映射 sendfile 临时文件：{e}") from e
+        mapping[:] = self.block
+        return block_file, mapping
+
+    def _close_block_files(self):
+        for block_file, mapping in self.block_files:
+            mapping.close()
+            block_file.close()
+        self.block_files = []
+
+    def _stream_loop(self, index: int):
+        try:
+            sock = socket.create_connection(self.address, timeout=5)
+        except OSError as e:
+            self.error = e
+            return
+        sock.settimeout(None)
+        self.tuning.apply(sock)
+        self.sockets[index] = sock
+        view = memoryview(self.block)
+        block_file = self.block_files[index][0] if self.block_files else None
+        try:
+            while self.running:
+                self.active.wait()
+                remaining = self.per_stream
+                while remaining > 0 and self.running and self.active.is_set():
+                    size = min(remaining, self.BLOCK_SIZE)
+                    if block_file is not None:
+                        # offset 为 0 时 send 退化实现不会 seek，每次先回到文件开头
+                        block_file.seek(0)
+                        sent = sock.sendfile(block_file, 0, size)
+                        if sent == 0:
+                            raise OSError("sendfile 未发送任何数据")
+                    else:
+                        sock.sendall(view[:size])
+                        sent = size
+                    self.stream_bytes[index] += sent
+                    remaining -= sent
+                if self.interval:
+                    self.wake.wait(self.interval)  # 不用 sleep，暂停/停止时能立即返回
+        except (OSError, ValueError) as e:  # ValueError：停止时文件已关闭
+            if self.running:
+                self.error = e
+        finally:
+            sock.close()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.stream_bytes)
+
+    def retransmits(self):
+        """所有流的累计重传段数，系统不支持时返回 None"""
+        total = None
+        for sock in self.sockets:
+            if sock is None:
+                continue
+            try:
+                value = tcp_retransmits(sock)
+            except (OSError, ValueError):
+                value = None  # 套接字已关闭
+            if value is None:
+                return None
+            total = (total or 0) + value
+        return total
+
+    def pause(self):
+        self.active.clear()
+        self.wake.set()
+
+    def resume(self):
+        self.wake.clear()
+        self.active.set()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.active.set()
+        for sock in self.sockets:
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)  # 唤醒阻塞在 sendall 上的线程
+                except OSError:
+                    pass
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self._close_block_files()
+
+
+class PayloadPool:
+    """预先生成的发送负载，热循环里只做取下一块（及写入序号）
+
+    constant：原来的全 'X' 负载；random：随机数据池，不可压缩、不可去重；
+    pattern：0..255 循环图案按不同相位切片；checksum：随机数据 + 包头（魔数、序号、CRC32），
+    接收端用 verify() 即可校验，CRC 只覆盖数据部分，写序号无需重算。
+    """
+
+    MODES = ("constant", "random", "pattern", "checksum")
+    MODE_NAMES = {"constant": "X 填充", "random": "随机", "pattern": "循环图案", "checksum": "校验"}
+    HEADER = struct.Struct("<4sII")  # 魔数, 序号, 数据部分 CRC32
+    MAGIC = b"TNMP"
+    POOL_BYTES = 4 * 1024 * 1024  # 数据池大小，足够大以免中间设备按内容去重
+
+    def __init__(self, mode: str, chunk_size: int):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的负载类型：{mode}")
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.seq = 0
+        self.index = 0
+        count = max(1, self.POOL_BYTES // chunk_size) if mode != "constant" else 1
+        if mode == "constant":
+            self.chunks = [b"X" * chunk_size]
+        elif mode == "pattern":
+            ring = bytes(range(256)) * (chunk_size // 256 + 2)
+            view = memoryview(ring)
+            self.chunks = [view[phase:phase + chunk_size] for phase in range(256)]
+        else:
+            data = memoryview(os.urandom(count * chunk_size))
+            self.chunks = [data[i * chunk_size:(i + 1) * chunk_size] for i in range(count)]
+            if mode == "checksum":
+                self.chunks = [self._seal(bytearray(chunk)) for chunk in self.chunks]
+
+    @classmethod
+    def _seal(cls, packet: bytearray) -> bytearray:
+        """写入包头并计算数据部分 CRC（序号先置 0）"""
+        if len(packet) >= cls.HEADER.size:
+            body_crc = zlib.crc32(memoryview(packet)[cls.HEADER.size:])
+            cls.HEADER.pack_into(packet, 0, cls.MAGIC, 0, body_crc)
+        return packet
+
+    def next(self, size: int):
+        """返回下一块负载（可直接交给 sendto/sendall），size 小于块大小时截短"""
+        chunk = self.chunks[self.index]
+        self.index += 1
+        if self.index == len(self.chunks):
+            self.index = 0
+        if self.mode == "checksum":
+            if size != self.chunk_size:
+                chunk = self._seal(bytearray(chunk[:size]))  # 每周期至多一次，允许慢一些
+            if size >= self.HEADER.size:
+                struct.pack_into("<I", chunk, 4, self.seq & 0xFFFFFFFF)
+                self.seq += 1
+            return chunk
+        return chunk if size == self.chunk_size else chunk[:size]
+
+    @classmethod
+    def make_block(cls, mode: str, size: int) -> bytes:
+        """生成一整块连续负载（TCP 流使用；没有包边界，校验模式按随机数据处理）"""
+        if mode == "constant":
+            return b"X" * size
+        if mode == "pattern":
+            return (bytes(range(256)) * (size // 256 + 1))[:size]
+        return os.urandom(size)
+
+    @classmethod
+    def verify(cls, packet):
+        """校验一个收到的包：返回 (是否完好, 序号)；不是校验负载时返回 (None, None)"""
+        if len(packet) < cls.HEADER.size:
+            return None, None
+        magic, seq, body_crc = cls.HEADER.unpack_from(packet)
+        if magic != cls.MAGIC:
+            return None, None
+        return zlib.crc32(memoryview(packet)[cls.HEADER.size:]) == body_crc, seq
+
+
+class SinkChannel:
+    """接收端的一路（单播端口或一个组播组）的统计"""
+
+    MISSING_WINDOW = 65536  # 只记住最近这么多个序号内的缺失，更早的乱序包按重复处理
+
+    def __init__(self, name: str):
+        self.name = name
+        self.packets = 0
+        self.bytes_received = 0
+        self.verified = 0  # 校验通过的包数
+        self.corrupt = 0  # 校验失败的包数
+        self.lost = 0  # 按序号推算的丢包数（仅校验负载）
+        self.duplicates = 0  # 重复收到的包数（不计入丢包补回）
+        self.next_seq = None  # 期望的下一个序号
+        self.missing = set()  # 记为丢失、迟到时可以补回的序号
+
+    def count(self, packet):
+        """统计一个收到的包"""
+        self.packets += 1
+        self.bytes_received += len(packet)
+        ok, seq = PayloadPool.verify(packet)
+        if ok is None:
+            return
+        if ok:
+            self.verified += 1
+        else:
+            self.corrupt += 1
+            return  # 损坏包的序号不可信
+        if seq == 0 or self.next_seq is None:
+            self.next_seq = seq + 1  # 发送端重新开始时序号从 0 起
+            self.missing.clear()
+        elif seq >= self.next_seq:
+            self.lost += seq - self.next_seq
+            self.missing.update(range(max(self.next_seq, seq - self.MISSING_WINDOW), seq))
+            self.next_seq = seq + 1
+            if len(self.missing) > self.MISSING_WINDOW:
+                oldest = self.next_seq - self.MISSING_WINDOW
+                self.missing = {s for s in self.missing if s >= oldest}
+        elif seq in self.missing:
+            self.missing.remove(seq)
+            self.lost -= 1  # 乱序到达，之前记为丢失的包补回来
+        else:
+            self.duplicates += 1
+
+    @property
+    def loss_ratio(self) -> float:
+        expected = self.verified - self.duplicates + self.lost
+        return self.lost / expected if expected else 0.0
+
+
+class UdpSink:
+    """本机 UDP 接收端：统计收到的包数、字节数，并校验带校验和的负载
+
+    不指定组播组时监听单播端口；指定组播组时每个组一个套接字（加入该组），
+    由同一个线程用 selectors 统一等待，分别统计各组的接收速率与丢包。
+    """
+
+    PORT = 12345
+
+    def __init__(self, port: int = PORT, groups=(), interface: str = "", tuning: SocketTuning = None):
+        import selectors
+        self.port = port
+        self.tuning = tuning or SocketTuning()
+        self.skipped_options = []  # 系统不支持而未能设置的选项
+        self.running = True
+        self.selector = selectors.DefaultSelector()
+        self.channels = []
+        # 唤醒用的套接字：stop() 向它发一个空包，让 select 立即返回
+        self.wake_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.wake_sock.bind(("127.0.0.1", 0))
+        self.selector.register(self.wake_sock, selectors.EVENT_READ, None)
+        try:
+            if groups:
+                for group in groups:
+                    self._add_socket(self._join_group(group, interface), group)
+            else:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.bind(("0.0.0.0", port))
+                self._add_socket(sock, "单播")
+        except OSError:
+            self._close()
+            raise
+        self.thread = threading.Thread(target=self._run, name="UdpSink", daemon=True)
+        self.thread.start()
+
+    def _join_group(self, group: str, interface: str) -> socket.socket:
+        """创建加入组播组的套接字"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # 多个组共用同一端口
+            # Linux 上绑定到组地址才能只收本组的包；Windows 不允许绑定组地址，按加入的组过滤
+            sock.bind((group if os.name != "nt" else "0.0.0.0", self.port))
+            membership = socket.inet_aton(group) + socket.inet_aton(interface or "0.0.0.0")
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _add_socket(self, sock: socket.socket, name: str):
+        import selectors
+        self.skipped_options = self.tuning.apply(sock)
+        sock.setblocking(False)
+        channel = SinkChannel(name)
+        self.channels.append(channel)
+        self.selector.register(sock, selectors.EVENT_READ, channel)
+
+    def _run(self):
+        buffer = bytearray(65535)
+        view = memoryview(buffer)
+        while self.running:
+            for key, _ in self.selector.select(0.5):
+                channel = key.data
+                if channel is None:
+                    continue  # 唤醒包
+                try:
+                    size = key.fileobj.recv_into(buffer)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    continue  # Windows 上收到 ICMP 端口不可达等错误时忽略
+                channel.count(view[:size])
+        self._close()
+
+    def _close(self):
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+    @property
+    def packets(self) -> int:
+        return sum(channel.packets for channel in self.channels)
+
+    @property
+    def bytes_received(self) -> int:
+        return sum(channel.bytes_received for channel in self.channels)
+
+    @property
+    def verified(self) -> int:
+        return sum(channel.verified for channel in self.channels)
+
+    @property
+    def corrupt(self) -> int:
+        return sum(channel.corrupt for channel in self.channels)
+
+    def stop(self):
+        """停止接收并等待端口释放"""
+        self.running = False
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as wake:
+                wake.sendto(b"", self.wake_sock.getsockname())
+        except OSError:
+            pass
+        self.thread.join(timeout=1.0)
+
+
+class SendConfig:
+    """一次发送任务的参数"""
+
+    def __init__(self, ip: str, total_bytes: int, interval_ms: int = 1000, protocol: str = "UDP",
+                 streams: int = 4, tuning: SocketTuning = None, tcp_method: str = "sendall", tcp_sink: bool = True,
+                 rtt_rate: float = 0.0, echo: bool = True, payload: str = "constant",
+                 mcast_ttl: int = 1, mcast_if: str = "", mcast_loop: bool = True):
+        self.ip = ip
+        self.total_bytes = total_bytes  # 每个周期发送的字节数，0 表示只发 RTT 探测
+        self.interval_ms = interval_ms  # 周期间隔（毫秒）
+        self.protocol = protocol  # "UDP" 或 "TCP"
+        self.streams = streams  # TCP 并行流数
+        self.tuning = tuning or SocketTuning()  # 套接字调优参数
+        self.tcp_method = tcp_method  # "sendall" 或 "sendfile"
+        self.tcp_sink = tcp_sink  # 是否在本机启动 TCP 接收端
+        self.rtt_rate = rtt_rate  # RTT 探测频率（次/秒），0 表示不探测
+        self.echo = echo  # 是否在本机启动回显端
+        self.payload = payload  # 负载类型，见 PayloadPool.MODES
+        self.mcast_ttl = mcast_ttl  # 组播 TTL（跳数）
+        self.mcast_if = mcast_if  # 组播出口网卡的 IPv4 地址，空表示系统默认
+        self.mcast_loop = mcast_loop  # 组播是否回环给本机的接收端
+
+    @property
+    def target_kind(self) -> str:
+        """目标地址类型，见 target_kind()"""
+        return target_kind(self.ip)
+
+
+def local_broadcast_addresses() -> set:
+    """本机各网卡 IPv4 子网的广播地址
+
+    按地址和掩码计算（Windows 上 psutil 不提供 broadcast 字段），/31、/32 没有广播地址。
+    """
+    import ipaddress
+    with STARTUP_TRACE.importing("psutil"):
+        import psutil
+    result = set()
+    for addresses in psutil.net_if_addrs().values():
+        for address in addresses:
+            if address.family != socket.AF_INET or not address.netmask:
+                continue
+            try:
+                network = ipaddress.IPv4Network(f"{address.address}/{address.netmask}", strict=False)
+            except ValueError:
+                continue
+            if network.prefixlen < 31:
+                result.add(str(network.broadcast_address))
+    return result
+
+
+def target_kind(ip: str) -> str:
+    """判断目标地址是单播、组播（224.0.0.0/4）还是广播
+
+    广播指 255.255.255.255 或本机某个网卡所在子网的广播地址；只看末段是否为 255 并不可靠，
+    例如 /23 中的 10.0.1.255 是普通主机，/25 的广播地址则是 x.x.x.127。
+    """
+    first = int(ip.split(".")[0])
+    if 224 <= first <= 239:
+        return "multicast"
+    if ip == "255.255.255.255" or ip in local_broadcast_addresses():
+        return "broadcast"
+    return "unicast"
+
+
+class SenderWorker:
+    """常驻的发送线程，由命令队列驱动 开始/暂停/继续 状态机
+
+    状态：IDLE（未开始或已出错）→ RUNNING ⇄ PAUSED。
+    “开始” 总是按新参数重新开始并清零统计；“继续” 沿用原参数、原套接字，
+    累计字节数和有效发送时长（不含暂停时间）接着算。
+    UDP 直接在本线程发送；TCP 多流、RTT 探测也由本线程统一启动、暂停和停止，
+    因此任何时刻最多只有一个发送循环在运行。
+    """
+
+    IDLE = "idle"
+    RUNNING = "running"
+    PAUSED = "paused"
+
+    UDP_PORT = 12345
+    CHUNK_SIZE = 8192
+
     def __init__(self):
-        super().__init__()
+        self.commands = queue.Queue()
+        self.wakeup = threading.Event()  # 有新命令时置位，打断发送循环和等待
+        self.lock = threading.Lock()  # 保护状态及统计的一致读取
+        self.state = self.IDLE
+        self.config = None
+        self.error = None
+        self.sock = None
+        self.sock_tuning = None  # 当前套接字已应用的调优参数（SocketTuning.key()）
+        self.skipped_options = []  # 系统不支持而未能设置的选项
+        self.backpressure = 0  # 发送缓冲区满（EAGAIN/ENOBUFS）的次数
+        self.bytes_sent = 0  # UDP 累计发送字节（只由本线程写入）
+        self.active_time = 0.0  # 之前各段 RUNNING 的累计时长（秒）
+        self.run_started = 0.0  # 本段 RUNNING 的开始时刻
+        self.payload = PayloadPool("constant", self.CHUNK_SIZE)
+        self.tcp_sender = None
+        self.tcp_sink = None
+        self.rtt_client = None
+        self.echo_responder = None
+        self.thread = threading.Thread(target=self._run, name="SenderWorker", daemon=True)
+        self.thread.start()
+
+    # ---------- 供界面线程调用的命令 ----------
+    def _post(self, command: str, arg=None):
+        self.commands.put((command, arg))
+        self.wakeup.set()
+
+    def start(self, config: SendConfig):
+        """按新参数重新开始（统计清零）"""
+        self._post("start", config)
+
+    def pause(self):
+        self._post("pause")
+
+    def resume(self):
+        """按原参数继续（统计接着算）"""
+        self._post("resume")
+
+    def shutdown(self):
+        """停止全部发送并结束线程"""
+        self._post("shutdown")
+        self.thread.join(timeout=2.0)
+
+    def snapshot(self):
+        """返回 (状态, 累计发送字节, 有效发送时长秒, 错误)"""
+        with self.lock:
+            elapsed = self.active_time
+            if self.state == self.RUNNING:
+                elapsed += time.monotonic() - self.run_started
+            sent = self.tcp_sender.total_bytes if self.tcp_sender else self.bytes_sent
+            return self.state, sent, elapsed, self.error
+
+    # ---------- 工作线程 ----------
+    def _run(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # 调优参数不变时一直复用
+        try:
+            while True:
+                config = self.config
+                if self.state == self.RUNNING and config.protocol == "UDP" and config.total_bytes > 0:
+                    self._send_cycle(self.sock, config)
+                    self.wakeup.wait(config.interval_ms / 1000.0)
+                else:
+                    # TCP 由各流线程发送，这里每秒检查一次是否出错
+                    self.wakeup.wait(1.0 if self.tcp_sender else None)
+                    tcp_sender = self.tcp_sender
+                    if self.state == self.RUNNING and tcp_sender and tcp_sender.error:
+                        self._fail(tcp_sender.error)
+                self.wakeup.clear()
+                while True:
+                    try:
+                        command, arg = self.commands.get_nowait()
+                    except queue.Empty:
+                        break
+                    if command == "shutdown":
+                        return
+                    if command == "start":
+                        self._on_start(arg)
+                    elif command == "pause":
+                        self._on_pause()
+                    elif command == "resume":
+                        self._on_resume()
+        finally:
+            self._stop_helpers()
+            self.sock.close()
+
+    def _send_cycle(self, sock: socket.socket, config: SendConfig):
+        """发送一个周期的数据，收到新命令时立即中断"""
+        address = (config.ip, self.UDP_PORT)
+        next_payload = self.payload.next
+        chunk = self.CHUNK_SIZE
+        wakeup = self.wakeup
+        remaining = config.total_bytes
+        try:
+            while remaining > 0 and not wakeup.is_set():
+                size = chunk if remaining >= chunk else remaining
+                packet = next_payload(size)
+                while True:
+                    try:
+                        sock.sendto(packet, address)
+                        break
+                    except OSError as e:
+                        if e.errno not in _BACKPRESSURE_ERRNOS:
+                            raise
+                        # 发送缓冲区满：计数，等到可写（或有新命令）再重发同一个包
+                        self.backpressure += 1
+                        if wakeup.is_set():
+                            return
+                        select.select((), (sock,), (), 0.05)
+                self.bytes_sent += size
+                remaining -= size
+        except OSError as e:
+            self._fail(e)
+
+    def _fail(self, error: Exception):
+        """发送出错：停止本次任务，保留统计供查看"""
+        self._stop_helpers(keep_stats=True)
+        with self.lock:
+            if self.state == self.RUNNING:
+                self.active_time += time.monotonic() - self.run_started
+            self.error = error
+            self.state = self.IDLE
+
+    def _on_start(self, config: SendConfig):
+        self._stop_helpers()
+        with self.lock:
+            self.config = config
+            self.error = None
+            self.bytes_sent = 0
+            self.active_time = 0.0
+            self.backpressure = 0
+        if config.payload != self.payload.mode:
+            self.payload = PayloadPool(config.payload, self.CHUNK_SIZE)  # 在热循环之外生成
+        else:
+            self.payload.seq = 0  # 每次开始都从序号 0 计，接收端按本次会话统计丢包/乱序
+            self.payload.index = 0
+        try:
+            self._configure_socket(config)
+            if config.rtt_rate > 0:
+                if config.echo:
+                    self.echo_responder = UdpEchoResponder(tuning=config.tuning)
+                self.rtt_client = RttProbeClient(config.ip, UdpEchoResponder.PORT, config.rtt_rate,
+                                                 tuning=config.tuning)
+            if config.protocol == "TCP" and config.total_bytes > 0:
+                if config.tcp_sink:
+                    self.tcp_sink = TcpSink(tuning=config.tuning)
+                self.tcp_sender = TcpBulkSender(config.ip, TcpSink.PORT, config.streams, config.total_bytes,
+                                                config.interval_ms, tuning=config.tuning,
+                                                method=config.tcp_method, payload=config.payload)
+        except OSError as e:
+            self._stop_helpers()
+            with self.lock:
+                self.error = e
+                self.state = self.IDLE
+            return
+        with self.lock:
+            self.state = self.RUNNING
+            self.run_started = time.monotonic()
+
+    def _configure_socket(self, config: SendConfig):
+        """按调优参数和目标类型设置 UDP 套接字（组播 TTL/出口/回环，广播权限）"""
+        if config.tuning.key() != self.sock_tuning:
+            # 缓冲区等选项无法可靠地恢复为系统默认值，参数变化时换一个新套接字
+            if self.sock_tuning is not None:
+                self.sock.close()
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.skipped_options = config.tuning.apply(self.sock)
+            self.sock.setblocking(not config.tuning.nonblocking)
+            self.sock_tuning = config.tuning.key()
+        sock = self.sock
+        kind = config.target_kind
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1 if kind == "broadcast" else 0)
+        if kind == "multicast":
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, config.mcast_ttl)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                            socket.inet_aton(config.mcast_if or "0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if config.mcast_loop else 0)
+
+    def _on_pause(self):
+        if self.state != self.RUNNING:
+            return
+        with self.lock:
+            self.active_time += time.monotonic() - self.run_started
+            self.state = self.PAUSED
+        if self.tcp_sender:
+            self.tcp_sender.pause()
+        if self.rtt_client:
+            self.rtt_client.pause()
+
+    def _on_resume(self):
+        if self.state != self.PAUSED:
+            return
+        if self.tcp_sender:
+            self.tcp_sender.resume()
+        if self.rtt_client:
+            self.rtt_client.resume()
+        with self.lock:
+            self.state = self.RUNNING
+            self.run_started = time.monotonic()
+
+    def _stop_helpers(self, keep_stats: bool = False):
+        """停止 TCP 发送端/接收端、RTT 探测及回显端
+
+        keep_stats 为 True 时保留已停止的对象，界面仍可读取最终的计数和直方图。
+        """
+        for helper in (self.tcp_sender, self.tcp_sink, self.rtt_client, self.echo_responder):
+            if helper is not None:
+                helper.stop()
+        if not keep_stats:
+            with self.lock:
+                self.tcp_sender = None
+                self.tcp_sink = None
+            self.rtt_client = None
+            self.echo_responder = None
+
+
+# -------------------- 自动化测试场景（--run） --------------------
+# 断言的比较运算符
+_ASSERT_OPS = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+_SCENARIO_KEYS = {"name", "duration", "sample_interval", "sender", "sink", "memory_mb", "interfaces",
+                  "assertions"}
+_SENDER_KEYS = {"ip", "size_mb", "interval_ms", "target_mbps", "protocol", "streams", "payload", "tcp_method", "tcp_sink",
+                "rtt_rate", "echo", "mcast_ttl", "mcast_if", "mcast_loop", "socket"}
+_SOCKET_KEYS = {"sndbuf_kb", "rcvbuf_kb", "dscp", "nonblocking", "busy_poll_us"}
+
+
+def _parse_assertion(text: str):
+    """解析 “指标 运算符 数值” 形式的断言，如 "rate_ratio >= 0.95"、"rtt_p99_ms < 2" """
+    parts = str(text).split()
+    if len(parts) != 3 or parts[1] not in _ASSERT_OPS:
+        raise ValueError(f"断言格式应为 '指标 运算符 数值'：{text}")
+    try:
+        return parts[0], parts[1], float(parts[2])
+    except ValueError:
+        raise ValueError(f"断言的比较值不是数字：{text}") from None
+
+
+def _check_keys(section: dict, allowed: set, where: str):
+    """无人值守运行时拼错的键不能悄悄被忽略"""
+    if not isinstance(section, dict):
+        raise ValueError(f"{where} 必须是 JSON 对象")
+    unknown = set(section) - allowed
+    if unknown:
+        raise ValueError(f"{where} 中有未知的键：{', '.join(sorted(unknown))}")
+
+
+def _scenario_config(sender: dict) -> SendConfig:
+    """把场景里的发送配置转换为 SendConfig"""
+    _check_keys(sender, _SENDER_KEYS, "sender")
+    if "ip" not in sender:
+        raise ValueError("sender 缺少目标 ip")
+    ip = sender["ip"]
+    socket.inet_aton(ip)
+    total_bytes = int(float(sender.get("size_mb", 0)) * 1024 * 1024)
+    rtt_rate = float(sender.get("rtt_rate", 0))
+    if total_bytes < 0 or rtt_rate < 0 or (total_bytes == 0 and rtt_rate == 0):
+        raise ValueError("size_mb 与 rtt_rate 至少有一个大于0")
+    protocol = str(sender.get("protocol", "UDP")).upper()
+    if protocol not in ("UDP", "TCP"):
+        raise ValueError(f"未知的协议：{protocol}")
+    if protocol == "TCP" and target_kind(ip) != "unicast":
+        raise ValueError("组播/广播只支持 UDP")
+    payload = sender.get("payload", "constant")
+    if payload not in PayloadPool.MODES:
+        raise ValueError(f"未知的负载类型：{payload}，可选：{', '.join(PayloadPool.MODES)}")
+    # 与 start_sending 的界面校验保持一致
+    interval_ms = int(sender.get("interval_ms", 1000))
+    if interval_ms < 0:
+        raise ValueError("interval_ms 必须>=0")
+    streams = int(sender.get("streams", 4))
+    if protocol == "TCP" and streams < 1:
+        raise ValueError("streams 必须>=1")
+    tcp_method = sender.get("tcp_method", "sendall")
+    if tcp_method not in ("sendall", "sendfile"):
+        raise ValueError(f"未知的 TCP 发送方式：{tcp_method}，可选：sendall, sendfile")
+    mcast_ttl = int(sender.get("mcast_ttl", 1))
+    if not 0 <= mcast_ttl <= 255:
+        raise ValueError("mcast_ttl 必须在 0~255 之间")
+    mcast_if = sender.get("mcast_if", "")
+    if mcast_if:
+        socket.inet_aton(mcast_if)
+    options = sender.get("socket", {})
+    _check_keys(options, _SOCKET_KEYS, "sender.socket")
+    tuning = SocketTuning(sndbuf=int(options.get("sndbuf_kb", 0)) * 1024,
+                          rcvbuf=int(options.get("rcvbuf_kb", 0)) * 1024,
+                          dscp=int(options.get("dscp", 0)), nonblocking=bool(options.get("nonblocking", False)),
+                          busy_poll_us=int(options.get("busy_poll_us", 0)))
+    return SendConfig(ip, total_bytes, interval_ms, protocol=protocol, streams=streams, tuning=tuning,
+                      tcp_method=tcp_method, tcp_sink=bool(sender.get("tcp_sink", True)),
+                      rtt_rate=rtt_rate, echo=bool(sender.get("echo", True)), payload=payload,
+                      mcast_ttl=mcast_ttl, mcast_if=mcast_if, mcast_loop=bool(sender.get("mcast_loop", True)))
+
+
+def load_scenario(path: str) -> dict:
+    """读取并校验场景文件（JSON），格式错误时抛出 ValueError
+
+    示例：
+        {"name": "nightly-loopback", "duration": 60, "sample_interval": 1,
+         "sender": {"ip": "127.0.0.1", "size_mb": 10, "interval_ms": 100, "target_mbps": 600,
+                    "payload": "checksum",
+                    "rtt_rate": 100, "socket": {"sndbuf_kb": 1024}},
+         "sink": {"port": 12345}, "memory_mb": 512, "interfaces": ["lo"],
+         "assertions": ["rate_ratio >= 0.95", "rtt_p99_ms < 2", "sink_loss_ratio <= 0.001"]}
+    """
+    import json
+    with open(path, encoding="utf-8") as f:
+        scenario = json.load(f)
+    try:
+        _validate_scenario(scenario)
+    except TypeError as e:
+        raise ValueError(f"场景中的值类型不对：{e}") from None
+    return scenario
+
+
+def _validate_scenario(scenario):
+    """检查场景各项的取值，错误时抛出 ValueError（类型不对时为 TypeError）"""
+    _check_keys(scenario, _SCENARIO_KEYS, "场景")
+    if float(scenario.get("duration", 0)) <= 0:
+        raise ValueError("duration（秒）必须大于0")
+    if float(scenario.get("sample_interval", 1.0)) <= 0:
+        raise ValueError("sample_interval（秒）必须大于0")
+    if float(scenario.get("memory_mb", 0)) < 0:
+        raise ValueError("memory_mb 必须>=0")
+    if "sender" in scenario:
+        _scenario_config(scenario["sender"])
+    sink = scenario.get("sink")
+    if sink is not None:
+        _check_keys(sink, {"port", "groups", "interface"}, "sink")
+        if not 0 < int(sink.get("port", UdpSink.PORT)) < 65536:
+            raise ValueError("sink.port 必须在 1~65535 之间")
+        for group in sink.get("groups", []):
+            socket.inet_aton(group)
+            if target_kind(group) != "multicast":
+                raise ValueError(f"{group} 不是组播地址")
+    if not all(isinstance(name, str) for name in scenario.get("interfaces", [])):
+        raise ValueError("interfaces 必须是网卡名列表")
+    target = scenario.get("sender", {}).get("target_mbps")
+    if target is not None and float(target) <= 0:
+        raise ValueError("target_mbps 必须大于0")
+    for text in scenario.get("assertions", []):
+        metric, _, _ = _parse_assertion(text)
+        if metric == "rate_ratio" and target is None:
+            raise ValueError("断言 rate_ratio 需要在 sender 中填写 target_mbps")
+
+
+def _assertion_value(text: str, metrics: dict, series: dict):
+    """查找断言引用的值：先找汇总指标，再找 “序列名.统计量”（如 send_mbps.p50）"""
+    if text in metrics:
+        return metrics[text]
+    name, _, stat = text.rpartition(".")
+    return series.get(name, {}).get(stat)
+
+
+def run_scenario(scenario: dict, progress=None) -> dict:
+    """无人值守地执行一个场景，返回报告（可直接写成 JSON）
+
+    按 sample_interval 采样发送/接收速率、RTT、进程内存及各网卡速率，
+    结束后汇总为指标和序列统计（与 --analyze 相同的 _series_summary），再逐条判定断言。
+    progress 不为 None 时每次采样调用一次，参数为一行进度文本。
+    """
+    with STARTUP_TRACE.importing("psutil"):
+        import psutil
+    duration = float(scenario["duration"])
+    sample_interval = float(scenario.get("sample_interval", 1.0))
+    config = _scenario_config(scenario["sender"]) if "sender" in scenario else None
+    interfaces = list(scenario.get("interfaces", []))
+    nic_start = psutil.net_io_counters(pernic=True)
+    missing = [name for name in interfaces if name not in nic_start]
+    if missing:
+        raise ValueError(f"找不到网卡：{', '.join(missing)}，可选：{', '.join(nic_start)}")
+
+    process = psutil.Process()
+    memory_manager = MemoryManager()
+    sink = worker = None
+    error = None
+    series = {}  # 序列名 -> (时刻列表, 数值列表)
+
+    def add(name, when, value):
+        times, values = series.setdefault(name, ([], []))
+        times.append(when)
+        values.append(value)
+
+    snmp_base = read_udp_snmp()
+    started_at = time.time()
+    start = time.monotonic()
+    sent = received = 0
+    try:
+        if scenario.get("memory_mb"):
+            memory_manager.add_memory(int(scenario["memory_mb"]))
+        sink_spec = scenario.get("sink")
+        if sink_spec is not None:
+            sink = UdpSink(int(sink_spec.get("port", UdpSink.PORT)), sink_spec.get("groups", ()),
+                           sink_spec.get("interface", ""), config.tuning if config else None)
+        if config:
+            worker = SenderWorker()
+            worker.start(config)
+        deadline = start + duration
+        last_time, last_sent, last_received, last_nic = start, 0, 0, nic_start
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            time.sleep(min(sample_interval, deadline - now))
+            now = time.monotonic()
+            wall = time.time()
+            dt = now - last_time
+            line = [f"{now - start:6.1f}s"]
+            if worker:
+                state, sent, _, error = worker.snapshot()
+                if error is not None:
+                    break
+                add("send_mbps", wall, (sent - last_sent) * 8 / (1024 * 1024) / dt)
+                line.append(f"发送 {series['send_mbps'][1][-1]:.1f} Mbps")
+                rtt_client = worker.rtt_client
+                if rtt_client and rtt_client.interval_histogram.total:
+                    # 本采样间隔内的 p99（不是累计值），序列的 p50/max 才有意义
+                    add("rtt_p99_interval_ms", wall, rtt_client.interval_histogram.percentile(99) / 1000)
+                    rtt_client.interval_histogram.reset()
+                    line.append(f"RTT p99 {series['rtt_p99_interval_ms'][1][-1]:.2f} ms")
+            if sink:
+                received = sink.bytes_received
+                add("sink_mbps", wall, (received - last_received) * 8 / (1024 * 1024) / dt)
+                line.append(f"接收 {series['sink_mbps'][1][-1]:.1f} Mbps")
+            add("rss_mb", wall, process.memory_info().rss / (1024 * 1024))
+            nic = psutil.net_io_counters(pernic=True)
+            for name in interfaces:
+                if name in nic:
+                    add(f"if.{name}.tx_mbps", wall, (nic[name].bytes_sent - last_nic[name].bytes_sent)
+                        * 8 / (1024 * 1024) / dt)
+                    add(f"if.{name}.rx_mbps", wall, (nic[name].bytes_recv - last_nic[name].bytes_recv)
+                        * 8 / (1024 * 1024) / dt)
+            if progress:
+                progress("  ".join(line))
+            last_time, last_sent, last_received, last_nic = now, sent, received, nic
+    except KeyboardInterrupt:
+        error = "已中断"
+    except (OSError, ValueError, MemoryError) as e:
+        error = e
+    elapsed = time.monotonic() - start
+
+    # 先取最终统计，再停止发送端（停止后 RTT 客户端等对象会被释放）
+    metrics = {"duration_s": elapsed, "memory_mb": memory_manager.total_size / (1024 * 1024)}
+    if worker:
+        state, sent, active, worker_error = worker.snapshot()
+        error = error or worker_error
+        metrics["send_bytes"] = sent
+        metrics["send_rate_mbps"] = sent * 8 / (1024 * 1024) / active if active > 0 else 0.0
+        target = scenario["sender"].get("target_mbps")
+        if target is not None:
+            # 发送周期是 “发完 total_bytes 的时间 + interval_ms”，无法从参数推出名义速率，由场景给出
+            metrics["target_rate_mbps"] = float(target)
+            metrics["rate_ratio"] = metrics["send_rate_mbps"] / float(target)
+        metrics["backpressure"] = worker.backpressure
+        if worker.tcp_sender:
+            retrans = worker.tcp_sender.retransmits()
+            if retrans is not None:
+                metrics["tcp_retransmits"] = retrans
+        rtt_client = worker.rtt_client
+        if rtt_client:
+            histogram = rtt_client.histogram
+            metrics["rtt_p50_ms"] = histogram.percentile(50) / 1000
+            metrics["rtt_p99_ms"] = histogram.percentile(99) / 1000
+            metrics["rtt_max_ms"] = histogram.max / 1000
+            metrics["rtt_loss_ratio"] = rtt_client.lost / rtt_client.sent if rtt_client.sent else 0.0
+        worker.shutdown()
+    if sink:
+        sink.stop()
+        metrics["sink_bytes"] = sink.bytes_received
+        metrics["sink_rate_mbps"] = sink.bytes_received * 8 / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+        lost = sum(channel.lost for channel in sink.channels)
+        expected = sink.verified - sum(channel.duplicates for channel in sink.channels) + lost
+        metrics["sink_loss_ratio"] = lost / expected if expected else 0.0
+        metrics["sink_corrupt"] = sink.corrupt
+    memory_manager.reset_memory()
+    nic_end = psutil.net_io_counters(pernic=True)
+    for name in interfaces:
+        if name in nic_end and elapsed > 0:
+            metrics[f"if.{name}.tx_mbps"] = ((nic_end[name].bytes_sent - nic_start[name].bytes_sent)
+                                             * 8 / (1024 * 1024) / elapsed)
+            metrics[f"if.{name}.rx_mbps"] = ((nic_end[name].bytes_recv - nic_start[name].bytes_recv)
+                                             * 8 / (1024 * 1024) / elapsed)
+            metrics[f"if.{name}.drops"] = ((nic_end[name].dropin - nic_start[name].dropin)
+                                           + (nic_end[name].dropout - nic_start[name].dropout))
+    snmp_end = read_udp_snmp()
+    if snmp_base and snmp_end:
+        for name in ("InErrors", "RcvbufErrors", "SndbufErrors"):
+            metrics[f"udp_{name}"] = snmp_end.get(name, 0) - snmp_base.get(name, 0)
+
+    summaries = {name: _series_summary(times, values) for name, (times, values) in series.items() if values}
+    results = []
+    for text in scenario.get("assertions", []):
+        metric, op, expected = _parse_assertion(text)
+        value = _assertion_value(metric, metrics, summaries)
+        results.append({"assertion": text, "value": value,
+                        "passed": value is not None and _ASSERT_OPS[op](value, expected)})
+    return {
+        "name": scenario.get("name", ""),
+        "host": socket.gethostname(),
+        "started": datetime.fromtimestamp(started_at).isoformat(timespec="seconds"),
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "passed": error is None and all(result["passed"] for result in results),
+        "error": str(error) if error is not None else None,
+        "scenario": scenario,
+        "metrics": metrics,
+        "series": summaries,
+        "assertions": results,
+    }
+
+
+def run_main(argv: List[str]) -> int:
+    """命令行入口：--run <场景.json> [--report 报告.json] [--quiet]
+
+    返回码：0 全部断言通过，1 断言失败或运行出错，2 场景文件有误（便于夜间回归脚本判断）。
+    """
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(prog="timeNetworkMemorySendUDP --run",
+                                     description="无人值守地执行测试场景并输出 JSON 报告")
+    parser.add_argument("path", help="场景文件（JSON），格式见 load_scenario")
+    parser.add_argument("--report", help="报告文件，默认为场景文件旁的 <场景名>-report-<时间>.json")
+    parser.add_argument("--quiet", action="store_true", help="不打印每次采样的进度")
+    args = parser.parse_args(argv)
+    try:
+        scenario = load_scenario(args.path)
+        report = run_scenario(scenario, progress=None if args.quiet else print)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"场景无效：{e}")
+        return 2
+
+    report_path = args.report or os.path.join(
+        os.path.dirname(os.path.abspath(args.path)),
+        f"{os.path.splitext(os.path.basename(args.path))[0]}-report-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for result in report["assertions"]:
+        value = result["value"]
+        shown = "无此指标" if value is None else f"{value:.4g}"
+        print(f"[{'通过' if result['passed'] else '失败'}] {result['assertion']}（实际 {shown}）")
+    if report["error"]:
+        print(f"运行出错：{report['error']}")
+    print(f"{'通过' if report['passed'] else '失败'}，报告：{report_path}")
+    return 0 if report["passed"] else 1
+
+
+class ClockWindow(tk.Tk):
+    def __init__(self, print_startup_trace: bool = False):
+        with STARTUP_TRACE.phase("创建 Tk 主窗口"):
+            super().__init__()
 
         # 阻止系统休眠
         self.sleep_prevented = True
-        self.prevent_sleep()
+        with STARTUP_TRACE.phase("阻止系统休眠"):
+            self.prevent_sleep()
 
         # 各悬浮窗口初始状态
         self.network_window = None
         self.memory_window = None
         self.ip_window = None
         self.packet_sender_window = None
+        self.sink_window = None
+        self.loop_window = None
+
+        # 事件循环卡顿监控（打开监控窗口时才安装）
+        self.loop_monitor = LoopMonitor()
 
         # 初始化内存管理器
         self.memory_manager = MemoryManager()
 
+        # 后台线程的界面更新统一经由调度器，在 Tk 主线程按帧刷新
+        self.ui = UIDispatcher(self)
+        self.ui.start()
+
         # 主窗口属性设置
+        self.print_startup_trace = print_startup_trace
+        self.tray_icon = None
         self.geometry("85x30")
         self.attributes('-topmost', True)
         self.config(bg="black")
@@ -105,21 +2147,44 @@ class ClockWindow(tk.Tk):
         self.bind("<B1-Motion>", self.on_motion)
         self.bind("<Button-3>", self.show_menu)
 
-        # 创建系统托盘图标
-        self.create_tray_icon()
-
         self.update_time()  # 每秒更新时间
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.position_near_mouse()  # 定位在鼠标附近
+        STARTUP_TRACE.mark("时钟界面初始化")
 
-        # 数据包发送相关变量
-        self.is_sending = False
-        self.bytes_sent = 0
-        self.start_time = 0
-        self.lock = threading.Lock()
+        # 时钟显示出来之后再创建系统托盘图标，不拖慢首屏
+        self.after_idle(self.on_first_frame)
+
+        # 数据包接收端（未启动时为 None）
+        self.udp_sink = None
+        self.sink_last = None  # 上次刷新时的 (时刻, 接收字节)
+        self.sink_tick_id = None
+
+        # 数据包发送：常驻发送线程（首次开始时创建）及界面每秒刷新的状态
+        self.sender_worker = None
+        self.sender_tick_id = None
+        self.sender_paused = False  # 暂停/继续按钮当前的含义
+        self.sender_last = None  # 上次刷新时的 (时刻, 各流字节, 接收端字节)，用于计算增量速率
+
+        # 套接字调优参数（发送端和接收端共用）及开始时的内核 UDP 计数器基线（仅 Linux）
+        self.socket_tuning = SocketTuning()
+        self.socket_tuning_window = None
+        self.sender_snmp_base = None
+        self.sink_snmp_base = None
+
+        # 会话记录器（未开启记录时为 None）及定时落盘
+        self.recorder = None
+        self.recorder_tick_id = None
+
+        # 采样分析器（未在采样时为 None）
+        self.profiler = None
 
         # 网速刷新间隔（单位毫秒），默认1000ms
         self.network_refresh_interval = 1000
+        # 网速自适应采样（空闲退避/突发加速），打开网速窗口时创建采样器
+        self.network_adaptive = True
+        self.network_sampler = None
+        self.network_tick_id = None
 
         # 启动定时器，定期检查并恢复“阻止系统休眠”状态
         self.after(5000, self.prevent_sleep_if_needed)
@@ -147,34 +2212,75 @@ class ClockWindow(tk.Tk):
             menu.add_command(label="隐藏数据包发送", command=self.close_packet_sender_window)
         else:
             menu.add_command(label="显示数据包发送", command=self.open_packet_sender_window)
+        if self.sink_window:
+            menu.add_command(label="隐藏数据包接收", command=self.close_sink_window)
+        else:
+            menu.add_command(label="显示数据包接收", command=self.open_sink_window)
         auto_start_label = "禁用开机自启动" if self.is_auto_start_enabled() else "启用开机自启动"
         menu.add_command(label=auto_start_label, command=self.toggle_auto_start)
+        if self.loop_window:
+            menu.add_command(label="隐藏卡顿监控", command=self.close_loop_window)
+        else:
+            menu.add_command(label="显示卡顿监控", command=self.open_loop_window)
+        if self.profiler:
+            menu.add_command(label="停止性能采样", command=self.stop_profiling)
+        else:
+            menu.add_command(label="开始性能采样", command=self.start_profiling)
+        if self.recorder:
+            menu.add_command(label="停止记录会话", command=self.stop_recording)
+        else:
+            menu.add_command(label="开始记录会话", command=self.start_recording)
         menu.add_command(label="隐藏所有窗口", command=self.hide_all_windows)  # 添加隐藏选项
         menu.add_command(label="打开程序位置", command=self.show_file_local)  # 打开文件所在位置
         menu.add_command(label="关于此软件", command=self.show_about)
         menu.add_command(label="更新日志", command=self.show_changelog)
+        menu.add_command(label="启动耗时报告", command=self.show_startup_trace)
         menu.add_separator()
         menu.add_command(label="退出全部程序", command=self.on_closing)
         menu.post(event.x_root, event.y_root)
 
+    def on_first_frame(self):
+        """时钟首次显示后再加载托盘等子系统"""
+        self.update_idletasks()
+        STARTUP_TRACE.mark("时钟首帧显示")
+        self.create_tray_icon()
+        if self.print_startup_trace:
+            # 托盘在后台线程加载，稍等片刻再输出，报告才包含托盘的导入耗时
+            self.after(2000, lambda: print(STARTUP_TRACE.report()))
+
+    def show_startup_trace(self):
+        """显示启动耗时报告"""
+        total = (time.perf_counter() - STARTUP_TRACE.origin) * 1000
+        messagebox.showinfo("启动耗时报告", f"{STARTUP_TRACE.report()}\n\n运行时长：{total:.0f} ms")
+
     # ------------------- 系统托盘图标相关方法 -------------------
     def create_tray_icon(self):
-        """创建系统托盘图标"""
-        icon_path = 'clock.png'
-        if not os.path.exists(icon_path):
-            image = Image.new('RGB', (64, 64), color='yellow')
-        else:
-            image = Image.open(icon_path)
+        """创建系统托盘图标（在后台线程导入 pystray/PIL 并解码图标）"""
+        threading.Thread(target=self._run_tray_icon, daemon=True).start()
+
+    def _run_tray_icon(self):
+        """托盘线程：加载图标并运行托盘消息循环"""
+        with STARTUP_TRACE.importing("pystray"):
+            import pystray
+        with STARTUP_TRACE.importing("PIL.Image"):
+            from PIL import Image
+        with STARTUP_TRACE.phase("加载托盘图标"):
+            icon_path = 'clock.png'
+            if not os.path.exists(icon_path):
+                image = Image.new('RGB', (64, 64), color='yellow')
+            else:
+                image = Image.open(icon_path)
 
-        menu = pystray.Menu(
-            pystray.MenuItem("显示", self.show_all_windows),
-            pystray.MenuItem("退出", self.on_closing)
-        )
+            # 菜单回调在托盘线程上触发，交给 Tk 主线程执行
+            menu = pystray.Menu(
+                pystray.MenuItem("显示", lambda: self.ui.call(self.show_all_windows)),
+                pystray.MenuItem("退出", lambda: self.ui.call(self.on_closing))
+            )
 
-        self.tray_icon = pystray.Icon("ClockWindow", image, "多功能数字时钟", menu)
-        # self.tray_icon.on_click = lambda icon, query: self.show_all_windows(icon, query)
-        # self.tray_icon.on_double_click = lambda icon, item: self.show_all_windows(icon, item)
-        threading.Thread(target=self.tray_icon.run, daemon=True).start()
+            self.tray_icon = pystray.Icon("ClockWindow", image, "多功能数字时钟", menu)
+            # self.tray_icon.on_click = lambda icon, query: self.show_all_windows(icon, query)
+            # self.tray_icon.on_double_click = lambda icon, item: self.show_all_windows(icon, item)
+        self.tray_icon.run()
 
     def show_all_windows(self):
         print("show_all_windows called")  # 调试信息
@@ -187,6 +2293,10 @@ class ClockWindow(tk.Tk):
             self.ip_window.deiconify()
         if self.packet_sender_window:
             self.packet_sender_window.deiconify()
+        if self.sink_window:
+            self.sink_window.deiconify()
+        if self.loop_window:
+            self.loop_window.deiconify()
 
     def hide_all_windows(self):
         """隐藏所有窗口"""
@@ -199,22 +2309,10 @@ class ClockWindow(tk.Tk):
             self.ip_window.withdraw()
         if self.packet_sender_window:
             self.packet_sender_window.withdraw()
-
-
-    def on_closing(self):
-        """退出程序时关闭所有窗口和托盘图标"""
-        self.restore_sleep()
-        if self.network_window:
-            self.network_window.destroy()
-        if self.memory_window:
-            self.memory_window.destroy()
-        if self.ip_window:
-            self.ip_window.destroy()
-        if self.packet_sender_window:
-            self.close_packet_sender_window()
-        self.memory_manager.reset_memory()
-        self.tray_icon.stop()  # 停止托盘图标
-        self.destroy()
+        if self.sink_window:
+            self.sink_window.withdraw()
+        if self.loop_window:
+            self.loop_window.withdraw()
 
     def position_near_mouse(self):
         """将主窗口定位到鼠标附近"""
@@ -292,6 +2390,8 @@ class ClockWindow(tk.Tk):
 
     def is_auto_start_enabled(self):
         """检查是否启用了开机自启动"""
+        with STARTUP_TRACE.importing("winreg"):
+            import winreg
         try:
             key = winreg.OpenKey(winreg.HKEY_CURRENT_USER,
                                  r"Software\Microsoft\Windows\CurrentVersion\Run")
@@ -303,6 +2403,8 @@ class ClockWindow(tk.Tk):
 
     def set_auto_start(self, enable):
         """设置或取消开机自启动"""
+        with STARTUP_TRACE.importing("winreg"):
+            import winreg
         key = winreg.OpenKey(winreg.HKEY_CURRENT_USER,
                              r"Software\Microsoft\Windows\CurrentVersion\Run", 0, winreg.KEY_WRITE)
         if enable:
@@ -320,36 +2422,134 @@ class ClockWindow(tk.Tk):
         self.set_auto_start(not current_state)
         messagebox.showinfo("提示", f"开机自启动已{'启用' if not current_state else '禁用'}")
 
-    def show_file_local(self):
-        # print("位置")
-        # 获取当前程序文件的绝对路径
+    def get_program_path(self):
+        """获取当前程序文件的绝对路径"""
         if getattr(sys, 'frozen', False):
             # 如果是通过 PyInstaller 打包后的 exe
-            file_path = sys.executable
-        else:
-            # 普通 Python 脚本运行
-            file_path = os.path.abspath(__file__)
+            return sys.executable
+        # 普通 Python 脚本运行
+        return os.path.abspath(__file__)
 
-        # 获取目录路径
-        folder = os.path.dirname(file_path)
+    def show_file_local(self, file_path=None):
+        # print("位置")
+        # 默认选中当前程序文件
+        if file_path is None:
+            file_path = self.get_program_path()
 
         # 在资源管理器中打开目录，并选中该文件
+        with STARTUP_TRACE.importing("subprocess"):
+            import subprocess
         subprocess.run(f'explorer /select,"{file_path}"')
 
 
+    def start_profiling(self):
+        """询问采样时长并开始对所有线程进行采样分析"""
+        with STARTUP_TRACE.importing("tkinter.simpledialog"):
+            from tkinter import simpledialog
+        duration = simpledialog.askinteger("性能采样", "采样时长（秒）：", parent=self,
+                                           initialvalue=30, minvalue=1, maxvalue=3600)
+        if duration is None or self.profiler:
+            return
+        folder = os.path.dirname(self.get_program_path())
+        path = os.path.join(folder, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded")
+        self.profiler = SamplingProfiler(path, duration)
+        self.profiler.start()
+        self.after(500, self.check_profiling)
+
+    def stop_profiling(self):
+        """提前结束采样"""
+        if self.profiler:
+            self.profiler.stop()
+
+    def check_profiling(self):
+        """等待采样线程结束后提示结果"""
+        profiler = self.profiler
+        if profiler is None:
+            return
+        if profiler.running:
+            self.after(500, self.check_profiling)
+            return
+        self.profiler = None
+        if profiler.error:
+            messagebox.showerror("错误", f"无法写入采样结果：{profiler.error}")
+            return
+        summary = (f"采样完成：{profiler.samples} 次，时长 {profiler.elapsed:.1f} 秒，\n"
+                   f"最终采样间隔 {profiler.interval * 1000:.1f} ms，采样开销 {profiler.overhead:.1%}\n"
+                   f"{profiler.path}\n\n是否打开所在位置？")
+        if messagebox.askyesno("性能采样", summary):
+            self.show_file_local(profiler.path)
+
+    def start_recording(self):
+        """开始记录会话指标到程序目录下的二进制日志"""
+        folder = os.path.dirname(self.get_program_path())
+        path = os.path.join(folder, f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.bin")
+        try:
+            self.recorder = SessionRecorder(path)
+        except OSError as e:
+            messagebox.showerror("错误", f"无法创建记录文件：{e}")
+            return
+        # 先记一条当前内存占用，作为基线
+        self.recorder.record(SessionRecorder.KIND_MEMORY, self.memory_manager.total_size,
+                             len(self.memory_manager.memory_pool))
+        self.schedule_recorder_flush()
+        messagebox.showinfo("提示", f"开始记录会话：\n{path}\n"
+                                    f"分析命令：--analyze \"{path}\"")
+
+    def stop_recording(self):
+        """停止记录会话"""
+        if self.recorder_tick_id is not None:
+            self.after_cancel(self.recorder_tick_id)
+            self.recorder_tick_id = None
+        if self.recorder:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+
+    def schedule_recorder_flush(self):
+        """按记录器的落盘间隔定时检查（避免重复排队）"""
+        if self.recorder_tick_id is not None:
+            self.after_cancel(self.recorder_tick_id)
+        self.recorder_tick_id = self.after(int(self.recorder.flush_interval * 1000), self.flush_recorder)
+
+    def flush_recorder(self):
+        """定时落盘，使记录停顿时缓冲里的数据也不会滞留"""
+        self.recorder_tick_id = None
+        recorder = self.recorder
+        if recorder is None:
+            return
+        try:
+            recorder.flush_due()
+        except OSError as e:
+            self.stop_recording()
+            messagebox.showerror("错误", f"写入记录文件失败，已停止记录：{e}")
+            return
+        self.schedule_recorder_flush()
+
+    def record_memory(self):
+        """记录一次内存占用变化"""
+        recorder = self.recorder
+        if recorder:
+            recorder.record(SessionRecorder.KIND_MEMORY, self.memory_manager.total_size,
+                            len(self.memory_manager.memory_pool))
+
     def show_about(self):
         """显示关于信息"""
         about_text = (
-            "多功能数字时钟 V6.2.6\n" # 每次更新时更改 1/2
+            "多功能数字时钟 V6.4.2\n" # 每次更新时更改 1/2
             "作者：d770（由 d770本人 & Grok3(主) & ChatGPT4o 创作）\n"
             "功能：\n"
-            "- 显示时间 & 可选网速显示 (时间每秒校对一次，网速可自定义刷新间隔)\n"
+            "- 显示时间 & 可选网速显示 (时间每秒校对一次，网速可自定义刷新间隔，支持自适应采样)\n"
             "- 可选内存管理功能\n"
             "- 置顶 & 无边框设计\n"
             "- 拖动 & 右键菜单\n"
             "- 阻止/允许系统休眠 (默认阻止系统休眠)\n"
             "- 立即休眠系统\n"
             "- 向指定 IP 地址持续实时多线程发送UDP数据包（MB/GB，可设置发送频率）\n"
+            "- UDP 回显/RTT 探测，实时显示延迟百分位\n"
+            "- TCP 多流批量发送（可选本机接收端），显示各流速率及重传\n"
+            "- 可选随机/循环图案/带校验的发送负载，接收窗口可校验数据完整性\n"
+            "- 支持组播（TTL/接口/回环）和子网广播发送，接收端可加入多个组播组\n"
+            "- 套接字设置（收发缓冲/DSCP/非阻塞/忙轮询），显示内核 UDP 丢包计数\n"
+            "- 命令行无人值守测试：--run 场景.json，按断言判定通过/失败并输出 JSON 报告\n"
             "- 网速、内存管理及数据包发送功能可独立开关\n"
             "- 开机自启动选项 (默认关闭)\n"
             "- 鼠标悬停显示 IP 地址（悬浮窗口）\n"
@@ -367,6 +2567,101 @@ class ClockWindow(tk.Tk):
     # 更新日志
     def show_changelog(self): # 每次更新时更改 2/2
         changelog_text = """
+        V6.4.2---D261019\n
+        - 网速窗口新增自适应采样(右键菜单开关，默认开启)：持续空闲 10 秒后退避到每 5 秒刷新显示，\n
+        \t期间每 500ms 轮询一次计数器(不刷新界面)，短暂突发也能及时发现\n
+        \t检测到速率突变立即切到 100ms 快速采样并保持 3 秒\n
+        - 网速仍按刷新间隔显示平均值，峰值明显高于均值时一并显示(橙色)，短暂突发不再被平均掉\n
+        - 网速按实际采样间隔折算为每秒速率(原先刷新间隔不是 1000ms 时显示的是每间隔的字节数)\n
+        - 关闭网速窗口时取消下一次采样，避免重新打开后出现两个采样循环\n
+        
+        ===========================================\n
+        V6.4.1---D261019\n
+        - 新增无人值守测试：--run 场景.json [--report 报告.json] [--quiet]，\n
+        \t场景定义时长、发送配置(含套接字设置)、本机接收端、内存占用和监控网卡，\n
+        \t断言形如 "rate_ratio >= 0.95"、"rtt_p99_ms < 2"、"send_mbps.p50 > 100"\n
+        \t(rate_ratio 为实际速率 / sender.target_mbps，需在场景中填写目标速率)\n
+        - 报告为 JSON：汇总指标、各采样序列的均值/百分位/峰值及每条断言的结果，\n
+        \t返回码 0=通过 1=失败 2=场景无效，可直接用于夜间回归\n
+        
+        ===========================================\n
+        V6.4.0---D261019\n
+        - 数据包发送窗口新增'套接字设置'：SO_SNDBUF/SO_RCVBUF、DSCP、非阻塞发送、忙轮询(仅 Linux)，\n
+        \t发送端和接收端共用，下次开始/启动时生效(原'缓冲KB'输入框并入此处)\n
+        - 非阻塞发送时发送缓冲区满不再中止，计数后等待可写再重发\n
+        - 发送/接收窗口显示内核 UDP 计数器增量(InErrors/RcvbufErrors/SndbufErrors，仅 Linux)，\n
+        \t系统不支持的选项会提示'未生效'\n
+        
+        ===========================================\n
+        V6.3.9---D261019\n
+        - 数据包发送支持组播地址(224~239 开头)和广播地址(255.255.255.255 或本机子网的广播地址)，\n
+        \t可设置组播 TTL、出口网卡地址和是否回环到本机\n
+        - 数据包接收可填写多个组播组(逗号分隔)，分别显示各组的接收速率，\n
+        \t使用'校验'负载时还会按序号统计各组丢包数和丢包率\n
+        
+        ===========================================\n
+        V6.3.8---D261019\n
+        - 数据包发送新增'负载'选项：X 填充 / 随机 / 循环图案 / 校验，\n
+        \t随机数据不可压缩，避免被广域网优化、压缩 VPN 或去重设备'藏起'真实流量\n
+        \t负载在开始时预先生成，发送循环只取下一块，不影响发送速率\n
+        - 新增'数据包接收'窗口：统计接收速率，校验负载的 CRC32 并统计损坏包数\n
+        
+        ===========================================\n
+        V6.3.7---D261019\n
+        - 数据包发送改为一个常驻发送线程，由命令队列驱动开始/暂停/继续，\n
+        \t修复快速暂停再开始时两个发送循环同时运行、统计被清零的问题\n
+        - '暂停'后按钮变为'继续'：立即恢复，沿用原套接字和 TCP 连接，\n
+        \t累计字节和速率接着算（不含暂停时间）；'开始'总是按新参数重新开始\n
+        - 速率监控改为界面定时刷新，不再每次开始都新建监控线程\n
+        
+        ===========================================\n
+        V6.3.6---D261019\n
+        - 数据包发送新增 TCP 协议：多条并行流从预分配缓冲区发送，\n
+        \t可选 sendall(memoryview) 或 sendfile 方式，可设置套接字缓冲大小\n
+        - 可勾选'本机接收端'(端口 12347)，显示各流及合计速率、\n
+        \t接收端实际收到的速率，以及重传次数（仅 Linux 可获取）\n
+        
+        ===========================================\n
+        V6.3.5---D261019\n
+        - 数据包发送新增'RTT 探测'：按设定频率发送带时间戳的探测包，\n
+        \t由回显端(端口 12346)原样返回，可勾选'本机回显'在本机启动回显端\n
+        - 往返时延记入对数分桶直方图（内存固定），\n
+        \t在发送窗口实时显示 p50/p90/p99/p99.9/max 及丢失数\n
+        - 包大小填 0 时只发送探测包\n
+        
+        ===========================================\n
+        V6.3.4---D261019\n
+        - 新增'开始/停止性能采样'：按指定时长对所有线程采样调用栈，\n
+        \t结果以火焰图通用的 collapsed-stack 格式保存在程序目录，\n
+        \t采样开销超过 3% 时自动放大采样间隔\n
+        
+        ===========================================\n
+        V6.3.3---D261019\n
+        - 新增'卡顿监控'窗口：为每个定时回调和菜单命令计时，\n
+        \t显示事件循环延迟及最慢回调的次数/平均/p99/最大耗时，\n
+        \t右键可导出完整报告到程序目录\n
+        
+        ===========================================\n
+        V6.3.2---D261019\n
+        - 新增'开始记录会话'，把网速、发送计数和内存占用变化\n
+        \t写入程序目录下的定长二进制日志（带缓冲，超过 64MB 自动轮转）\n
+        - 新增离线分析：--analyze 会话文件 [--threshold net_up=1000000]，\n
+        \t输出各指标的百分位、峰值及超过阈值的时长\n
+        
+        ===========================================\n
+        V6.3.1---D261019\n
+        - 加快启动：托盘、网速、内存、发送、对话框等模块改为首次使用时才加载，\n
+        \t时钟最先显示，托盘图标在后台线程加载\n
+        - 新增'启动耗时报告'，列出各模块导入和初始化阶段的耗时，\n
+        \t也可用 --startup-trace 参数启动，在控制台输出报告\n
+        
+        ===========================================\n
+        V6.3.0---D261019\n
+        - 后台线程不再直接操作界面控件，\n
+        \t改为投递到界面更新队列，由主线程每帧合并刷新，\n
+        \t解决高速发送时偶发的卡死/崩溃\n
+        
+        ===========================================\n
         V6.2.6---D250505\n
         - 调整了打开主窗口显示在鼠标附近的默认位置，\n
         \t防止鼠标在屏幕边缘时主窗口显示在鼠标触及不到的地方\n
@@ -474,6 +2769,8 @@ class ClockWindow(tk.Tk):
         changelog_window.attributes('-topmost', True)  # 保持窗口置顶，与主程序风格一致
         changelog_window.config(bg="black")  # 设置背景色，与主程序风格一致
         # 创建 ScrolledText 控件，带滚动条
+        with STARTUP_TRACE.importing("tkinter.scrolledtext"):
+            from tkinter import scrolledtext
         text_area = scrolledtext.ScrolledText(
             changelog_window,
             wrap=tk.WORD,  # 自动换行
@@ -525,7 +2822,7 @@ class ClockWindow(tk.Tk):
         clock_y = self.winfo_y()
         clock_width = self.winfo_width()
         packet_width = 300
-        packet_height = 180
+        packet_height = 420
         packet_x = clock_x + clock_width + 5
         # packet_y = clock_y
         packet_y = clock_y + 35
@@ -546,6 +2843,8 @@ class ClockWindow(tk.Tk):
                                    insertbackground="white")
         self.size_entry.pack(side="left", padx=5)
         self.unit_var = tk.StringVar(value="MB")
+        with STARTUP_TRACE.importing("tkinter.ttk"):
+            from tkinter import ttk
         unit_menu = ttk.OptionMenu(size_frame, self.unit_var, "MB", "MB", "GB")
         unit_menu.pack(side="left", padx=5)
         unit_menu.config(width=5)
@@ -558,19 +2857,101 @@ class ClockWindow(tk.Tk):
         self.freq_entry.pack(side="left", padx=5)
         self.freq_entry.insert(0, "1000")
 
+        payload_frame = tk.Frame(self.packet_sender_window, bg="black")
+        payload_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(payload_frame, text="负载：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        names = [PayloadPool.MODE_NAMES[mode] for mode in PayloadPool.MODES]
+        self.payload_var = tk.StringVar(value=names[0])
+        payload_menu = ttk.OptionMenu(payload_frame, self.payload_var, names[0], *names)
+        payload_menu.pack(side="left", padx=5)
+        payload_menu.config(width=8)
+
+        # 协议选择：TCP 模式为多流批量发送，可在本机启动接收端
+        proto_frame = tk.Frame(self.packet_sender_window, bg="black")
+        proto_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(proto_frame, text="协议：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.protocol_var = tk.StringVar(value="UDP")
+        protocol_menu = ttk.OptionMenu(proto_frame, self.protocol_var, "UDP", "UDP", "TCP")
+        protocol_menu.pack(side="left", padx=5)
+        protocol_menu.config(width=4)
+        tk.Label(proto_frame, text="流数：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.streams_entry = tk.Entry(proto_frame, width=4, font=("Arial", 10), fg="white", bg="#333333",
+                                      insertbackground="white")
+        self.streams_entry.pack(side="left", padx=5)
+        self.streams_entry.insert(0, "4")
+
+        tcp_frame = tk.Frame(self.packet_sender_window, bg="black")
+        tcp_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(tcp_frame, text="TCP 发送方式：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.tcp_method_var = tk.StringVar(value="sendall")
+        method_menu = ttk.OptionMenu(tcp_frame, self.tcp_method_var, "sendall", "sendall", "sendfile")
+        method_menu.pack(side="left", padx=5)
+        method_menu.config(width=8)
+        self.tcp_sink_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(tcp_frame, text="本机接收端", variable=self.tcp_sink_var, font=("Arial", 10),
+                       fg="white", bg="black", selectcolor="#333333",
+                       activebackground="black", activeforeground="white").pack(side="left", padx=5)
+
+        # 组播选项：目标地址为 224.0.0.0~239.255.255.255 时生效；本机子网的广播地址按广播发送
+        mcast_frame = tk.Frame(self.packet_sender_window, bg="black")
+        mcast_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(mcast_frame, text="组播 TTL：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.mcast_ttl_entry = tk.Entry(mcast_frame, width=4, font=("Arial", 10), fg="white", bg="#333333",
+                                        insertbackground="white")
+        self.mcast_ttl_entry.pack(side="left", padx=5)
+        self.mcast_ttl_entry.insert(0, "1")
+        tk.Label(mcast_frame, text="接口：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.mcast_if_entry = tk.Entry(mcast_frame, width=13, font=("Arial", 10), fg="white", bg="#333333",
+                                       insertbackground="white")
+        self.mcast_if_entry.pack(side="left", padx=5)
+        self.mcast_loop_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(mcast_frame, text="回环", variable=self.mcast_loop_var, font=("Arial", 10),
+                       fg="white", bg="black", selectcolor="#333333",
+                       activebackground="black", activeforeground="white").pack(side="left")
+
+        # RTT 探测：可与大流量同时进行，包大小填 0 时只发探测包
+        rtt_frame = tk.Frame(self.packet_sender_window, bg="black")
+        rtt_frame.pack(fill="x", padx=10, pady=5)
+        self.rtt_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(rtt_frame, text="RTT 探测", variable=self.rtt_var, font=("Arial", 10),
+                       fg="white", bg="black", selectcolor="#333333",
+                       activebackground="black", activeforeground="white").pack(side="left")
+        self.rtt_rate_entry = tk.Entry(rtt_frame, width=6, font=("Arial", 10), fg="white", bg="#333333",
+                                       insertbackground="white")
+        self.rtt_rate_entry.pack(side="left", padx=5)
+        self.rtt_rate_entry.insert(0, "100")
+        tk.Label(rtt_frame, text="次/秒", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.echo_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(rtt_frame, text="本机回显", variable=self.echo_var, font=("Arial", 10),
+                       fg="white", bg="black", selectcolor="#333333",
+                       activebackground="black", activeforeground="white").pack(side="left", padx=5)
+
         button_frame = tk.Frame(self.packet_sender_window, bg="black")
         button_frame.pack(fill="x", padx=10, pady=5)
         self.start_button = tk.Button(button_frame, text="开始", font=("Arial", 10), fg="white", bg="#555555",
-                                      command=self.start_sending)
+                                      command=self.start_sending)  # 任何时候都按新参数重新开始
         self.start_button.pack(side="left", padx=5)
-        self.pause_button = tk.Button(button_frame, text="暂停", font=("Arial", 10), fg="white", bg="#555555",
-                                      command=self.pause_sending, state=tk.DISABLED)
+        active = self.sender_worker is not None and self.sender_worker.snapshot()[0] != SenderWorker.IDLE
+        self.pause_button = tk.Button(button_frame, text="继续" if self.sender_paused else "暂停",
+                                      font=("Arial", 10), fg="white", bg="#555555",
+                                      command=self.toggle_pause, state=tk.NORMAL if active else tk.DISABLED)
         self.pause_button.pack(side="left", padx=5)
+        tk.Button(button_frame, text="套接字设置", font=("Arial", 10), fg="white", bg="#555555",
+                  command=self.open_socket_tuning_window).pack(side="left", padx=5)
 
         self.packet_status_label = tk.Label(self.packet_sender_window,
                                             text="请输入参数并点击开始",
                                             font=("Arial", 10), fg="yellow", bg="black", pady=5)
         self.packet_status_label.pack(fill="x")
+        self.rtt_label = tk.Label(self.packet_sender_window, text="",
+                                  font=("Arial", 9), fg="white", bg="black")
+        self.rtt_label.pack(fill="x")
+        self.tcp_label = tk.Label(self.packet_sender_window, text="",
+                                  font=("Arial", 9), fg="white", bg="black")
+        self.tcp_label.pack(fill="x")
+        self.kernel_label = tk.Label(self.packet_sender_window, text="",
+                                     font=("Arial", 9), fg="white", bg="black")
+        self.kernel_label.pack(fill="x")
 
         # 绑定数据包发送窗口拖动事件
         self.packet_sender_window.bind("<Button-1>", self.start_move_packet)
@@ -579,6 +2960,9 @@ class ClockWindow(tk.Tk):
 
     def close_packet_sender_window(self):
         """关闭数据包发送窗口"""
+        if self.socket_tuning_window is not None:
+            self.socket_tuning_window.destroy()
+            self.socket_tuning_window = None
         if self.packet_sender_window:
             self.packet_sender_window.destroy()
             self.packet_sender_window = None
@@ -594,74 +2978,366 @@ class ClockWindow(tk.Tk):
         new_y = event.y_root - self.packet_offset_y
         self.packet_sender_window.geometry(f"+{new_x}+{new_y}")
 
+    def open_socket_tuning_window(self):
+        """打开套接字设置窗口（发送端和接收端共用，下次开始/启动时生效）"""
+        if self.socket_tuning_window is not None:
+            return
+        self.socket_tuning_window = tk.Toplevel(self.packet_sender_window)
+        self.socket_tuning_window.overrideredirect(True)
+        self.socket_tuning_window.attributes("-topmost", True)
+        self.socket_tuning_window.config(bg="black")
+        px = self.packet_sender_window.winfo_x()
+        py = self.packet_sender_window.winfo_y()
+        self.socket_tuning_window.geometry(f"260x210+{px + 20}+{py + 60}")
+
+        self.socket_tuning_window.bind("<Button-1>", self.start_drag_tuning)
+        self.socket_tuning_window.bind("<B1-Motion>", self.do_drag_tuning)
+
+        tuning = self.socket_tuning
+        self.tuning_entries = {}
+        for key, text, value in (("sndbuf", "SO_SNDBUF（KB，0=默认）：", tuning.sndbuf // 1024),
+                                 ("rcvbuf", "SO_RCVBUF（KB，0=默认）：", tuning.rcvbuf // 1024),
+                                 ("dscp", "DSCP（0~63）：", tuning.dscp),
+                                 ("busy_poll", "忙轮询（µs，仅 Linux）：", tuning.busy_poll_us)):
+            frame = tk.Frame(self.socket_tuning_window, bg="black")
+            frame.pack(fill="x", padx=10, pady=3)
+            tk.Label(frame, text=text, font=("Arial", 10), fg="white", bg="black").pack(side="left")
+            entry = tk.Entry(frame, width=7, font=("Arial", 10), fg="white", bg="#333333",
+                             insertbackground="white")
+            entry.pack(side="right")
+            entry.insert(0, str(value))
+            self.tuning_entries[key] = entry
+        self.nonblocking_var = tk.BooleanVar(value=tuning.nonblocking)
+        tk.Checkbutton(self.socket_tuning_window, text="非阻塞发送（缓冲区满时计数并等待）",
+                       variable=self.nonblocking_var, font=("Arial", 10),
+                       fg="white", bg="black", selectcolor="#333333",
+                       activebackground="black", activeforeground="white").pack(anchor="w", padx=10)
+        tk.Button(self.socket_tuning_window, text="确定", font=("Arial", 10), fg="white", bg="#555555",
+                  command=self.set_socket_tuning).pack(pady=5)
+
+    def start_drag_tuning(self, event):
+        """记录套接字设置窗口拖动起始位置"""
+        self.tuning_drag_x = event.x
+        self.tuning_drag_y = event.y
+
+    def do_drag_tuning(self, event):
+        """拖动套接字设置窗口"""
+        x = self.socket_tuning_window.winfo_x() + (event.x - self.tuning_drag_x)
+        y = self.socket_tuning_window.winfo_y() + (event.y - self.tuning_drag_y)
+        self.socket_tuning_window.geometry(f"+{x}+{y}")
+
+    def set_socket_tuning(self):
+        """保存套接字设置"""
+        try:
+            values = {key: int(entry.get() or 0) for key, entry in self.tuning_entries.items()}
+            if min(values.values()) < 0:
+                raise ValueError
+            if values["dscp"] > 63:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的非负整数（DSCP 为 0~63）")
+            return
+        self.socket_tuning = SocketTuning(sndbuf=values["sndbuf"] * 1024, rcvbuf=values["rcvbuf"] * 1024,
+                                          dscp=values["dscp"], nonblocking=self.nonblocking_var.get(),
+                                          busy_poll_us=values["busy_poll"])
+        self.socket_tuning_window.destroy()
+        self.socket_tuning_window = None
+
     def start_sending(self):
-        """开始发送数据包"""
+        """按当前参数开始（或重新开始）发送数据包"""
         try:
             ip = self.ip_entry.get().strip()
             socket.inet_aton(ip)  # 验证 IP 合法性
             size = float(self.size_entry.get())
-            if size <= 0:
+            rtt_enabled = self.rtt_var.get()
+            if size < 0 or (size == 0 and not rtt_enabled):
                 raise ValueError("包大小必须大于0")
+            rtt_rate = float(self.rtt_rate_entry.get()) if rtt_enabled else 0
+            if rtt_enabled and rtt_rate <= 0:
+                raise ValueError("探测频率必须大于0")
             unit = self.unit_var.get()
             total_bytes = int(size * (1024 * 1024 if unit == "MB" else 1024 * 1024 * 1024))
             interval_ms = int(self.freq_entry.get())
             if interval_ms < 0:
                 raise ValueError("发送间隔必须>=0")
+            protocol = self.protocol_var.get()
+            streams = int(self.streams_entry.get())
+            if protocol == "TCP" and streams < 1:
+                raise ValueError("流数必须>=1")
+            if protocol == "TCP" and target_kind(ip) != "unicast":
+                raise ValueError("组播/广播只支持 UDP")
+            mcast_ttl = int(self.mcast_ttl_entry.get())
+            if not 0 <= mcast_ttl <= 255:
+                raise ValueError("组播 TTL 必须在 0~255 之间")
+            mcast_if = self.mcast_if_entry.get().strip()
+            if mcast_if:
+                socket.inet_aton(mcast_if)
         except Exception as e:
-            self.packet_status_label.config(text=f"参数错误：{e}", fg="red")
+            self.ui.post(self.packet_status_label, text=f"参数错误：{e}", fg="red")
             return
 
-        self.is_sending = True
-        self.bytes_sent = 0
-        self.start_time = time.time()
-        self.start_button.config(state=tk.DISABLED)
-        self.pause_button.config(state=tk.NORMAL)
-        self.packet_status_label.config(text="开始发送数据包...", fg="green")
-
-        send_thread = threading.Thread(target=self.send_packets_loop, args=(ip, total_bytes, interval_ms), daemon=True)
-        send_thread.start()
-        monitor_thread = threading.Thread(target=self.monitor_rate, daemon=True)
-        monitor_thread.start()
+        config = SendConfig(ip, total_bytes, interval_ms, protocol=protocol, streams=streams,
+                            tuning=self.socket_tuning, tcp_method=self.tcp_method_var.get(),
+                            tcp_sink=self.tcp_sink_var.get(), rtt_rate=rtt_rate, echo=self.echo_var.get(),
+                            payload=next(mode for mode, name in PayloadPool.MODE_NAMES.items()
+                                         if name == self.payload_var.get()),
+                            mcast_ttl=mcast_ttl, mcast_if=mcast_if, mcast_loop=self.mcast_loop_var.get())
+        if self.sender_worker is None:
+            self.sender_worker = SenderWorker()
+        self.sender_worker.start(config)
+        self.sender_last = None
+        self.sender_snmp_base = read_udp_snmp()
+        self.ui.post(self.rtt_label, text="RTT 等待回显..." if rtt_enabled else "")
+        self.ui.post(self.tcp_label, text="")
+        self.ui.post(self.kernel_label, text="")
+        self.ui.post(self.packet_status_label, text="开始发送数据包...", fg="green")
+        # 按钮在 Tk 线程上直接更新，点击后立即生效（UIDispatcher 只用于汇总频繁变化的状态文字）
+        self.sender_paused = False
+        self.pause_button.config(text="暂停", state=tk.NORMAL)
+        self.schedule_sender_status()
+
+    def toggle_pause(self):
+        """暂停/继续按钮：按当前状态切换"""
+        if self.sender_paused:
+            self.resume_sending()
+        else:
+            self.pause_sending()
 
     def pause_sending(self):
-        """暂停发送数据包"""
-        self.is_sending = False
-        self.start_button.config(state=tk.NORMAL)
-        self.pause_button.config(state=tk.DISABLED)
-        self.packet_status_label.config(text="已暂停发送", fg="yellow")
-
-    def send_packets_loop(self, ip, total_bytes, interval_ms):
-        """持续发送数据包"""
-        CHUNK_SIZE = 8192
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        while self.is_sending:
-            bytes_sent_in_loop = 0
-            while bytes_sent_in_loop < total_bytes and self.is_sending:
-                remaining = total_bytes - bytes_sent_in_loop
-                send_size = CHUNK_SIZE if remaining >= CHUNK_SIZE else remaining
-                try:
-                    sock.sendto(b"X" * send_size, (ip, 12345))
-                except Exception as e:
-                    self.packet_status_label.config(text=f"发送失败：{e}", fg="red")
-                    self.is_sending = False
-                    break
-                with self.lock:
-                    self.bytes_sent += send_size
-                bytes_sent_in_loop += send_size
-            time.sleep(interval_ms / 1000.0)
-        sock.close()
+        """暂停发送数据包（连接和统计保留，可立即继续）"""
+        if self.sender_worker:
+            self.sender_worker.pause()
+        self.sender_paused = True
+        self.pause_button.config(text="继续")
+        self.ui.post(self.packet_status_label, text="已暂停发送", fg="yellow")
+
+    def resume_sending(self):
+        """按原参数继续发送，统计接着累计"""
+        if self.sender_worker:
+            self.sender_worker.resume()
+        self.sender_last = None
+        self.sender_paused = False
+        self.pause_button.config(text="暂停")
+        self.ui.post(self.packet_status_label, text="继续发送数据包...", fg="green")
+        self.schedule_sender_status()
+
+    def schedule_sender_status(self):
+        """一秒后刷新发送状态（避免重复排队）"""
+        if self.sender_tick_id is not None:
+            self.after_cancel(self.sender_tick_id)
+        self.sender_tick_id = self.after(1000, self.update_sender_status)
+
+    def update_sender_status(self):
+        """每秒刷新发送速率、TCP 各流、RTT 等信息；发送停止后不再排队"""
+        self.sender_tick_id = None
+        worker = self.sender_worker
+        if worker is None:
+            return
+        state, bytes_sent, elapsed, error = worker.snapshot()
+        if error is not None:
+            self.ui.post(self.packet_status_label, text=f"发送失败：{error}", fg="red")
+            self.sender_paused = False
+            if self.packet_sender_window:
+                self.pause_button.config(text="暂停", state=tk.DISABLED)
+            return
+        if state != SenderWorker.RUNNING:
+            if not self.sender_paused:
+                # “开始” 是异步的：工作线程可能还在停止上一次的任务，继续轮询直到进入 RUNNING
+                self.schedule_sender_status()
+            return
 
-    def monitor_rate(self):
-        """监控发送速率"""
-        while True:
-            time.sleep(1)
-            if not self.is_sending:
-                self.packet_status_label.config(text="已暂停发送", fg="yellow")
-                break
-            with self.lock:
-                elapsed = time.time() - self.start_time
-                rate = (self.bytes_sent * 8) / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
-            self.packet_status_label.config(text=f"发送中，速率：{rate:.2f} Mbps", fg="green")
+        rate = (bytes_sent * 8) / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+        recorder = self.recorder
+        if recorder:
+            recorder.record(SessionRecorder.KIND_SENDER, bytes_sent, rate * 1024 * 1024)
+        self.ui.post(self.packet_status_label, text=f"发送中，速率：{rate:.2f} Mbps", fg="green")
+
+        # 发送缓冲区满的次数、内核 UDP 丢包计数器增量，以及系统不支持而跳过的选项
+        kernel = []
+        if worker.backpressure:
+            kernel.append(f"缓冲区满 {worker.backpressure}")
+        snmp = format_udp_snmp_delta(self.sender_snmp_base, read_udp_snmp())
+        if snmp:
+            kernel.append(snmp)
+        if worker.skipped_options:
+            kernel.append("未生效：" + ",".join(worker.skipped_options))
+        self.ui.post(self.kernel_label, text=" ".join(kernel))
+
+        tcp_sender = worker.tcp_sender
+        if tcp_sender:
+            # TCP 各流的增量速率、接收端实际收到的速率（goodput）及重传
+            now = time.monotonic()
+            streams = list(tcp_sender.stream_bytes)
+            tcp_sink = worker.tcp_sink
+            received = tcp_sink.bytes_received if tcp_sink else 0
+            if self.sender_last is not None:
+                last_time, last_streams, last_received = self.sender_last
+                dt = now - last_time
+                stream_rates = [(cur - old) * 8 / (1024 * 1024) / dt for cur, old in zip(streams, last_streams)]
+                detail = "流(Mbps)：" + "/".join(f"{r:.1f}" for r in stream_rates)
+                detail += f" 合计 {sum(stream_rates):.1f}"
+                if tcp_sink:
+                    detail += f" 接收 {(received - last_received) * 8 / (1024 * 1024) / dt:.1f}"
+                retrans = tcp_sender.retransmits()
+                detail += f" 重传 {retrans if retrans is not None else 'N/A'}"
+                self.ui.post(self.tcp_label, text=detail)
+            self.sender_last = (now, streams, received)
+
+        rtt_client = worker.rtt_client
+        if rtt_client and rtt_client.received:
+            histogram = rtt_client.histogram
+            if recorder:
+                recorder.record(SessionRecorder.KIND_RTT, histogram.percentile(50), histogram.percentile(99))
+            self.ui.post(self.rtt_label,
+                         text=f"RTT(ms) {histogram.summary()} 丢失={rtt_client.lost}")
+        self.schedule_sender_status()
+
+    # -------------------- 数据包接收窗口 --------------------
+    def open_sink_window(self):
+        """打开数据包接收悬浮窗口"""
+        if self.sink_window:
+            return
+
+        self.sink_window = tk.Toplevel(self)
+        self.sink_window.attributes('-topmost', True)
+        self.sink_window.config(bg="black")
+        self.sink_window.overrideredirect(True)
+
+        # 定位在主窗口右侧，数据包发送窗口的上方
+        clock_x = self.winfo_x()
+        clock_y = self.winfo_y()
+        clock_width = self.winfo_width()
+        sink_width = 300
+        sink_height = 200
+        sink_x = clock_x + clock_width + 5
+        sink_y = clock_y - sink_height - 5
+        self.sink_window.geometry(f"{sink_width}x{sink_height}+{sink_x}+{max(sink_y, 5)}")
+
+        port_frame = tk.Frame(self.sink_window, bg="black")
+        port_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(port_frame, text="接收端口：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.sink_port_entry = tk.Entry(port_frame, width=8, font=("Arial", 10), fg="white", bg="#333333",
+                                        insertbackground="white")
+        self.sink_port_entry.pack(side="left", padx=5)
+        self.sink_port_entry.insert(0, str(UdpSink.PORT))
+        self.sink_button = tk.Button(port_frame, text="停止" if self.udp_sink else "启动",
+                                     font=("Arial", 10), fg="white", bg="#555555",
+                                     command=self.toggle_sink)
+        self.sink_button.pack(side="left", padx=5)
+
+        # 组播组（逗号分隔），留空则按单播接收
+        group_frame = tk.Frame(self.sink_window, bg="black")
+        group_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(group_frame, text="组播组：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.sink_groups_entry = tk.Entry(group_frame, width=25, font=("Arial", 10), fg="white", bg="#333333",
+                                          insertbackground="white")
+        self.sink_groups_entry.pack(side="left", padx=5)
+        if_frame = tk.Frame(self.sink_window, bg="black")
+        if_frame.pack(fill="x", padx=10)
+        tk.Label(if_frame, text="接口：", font=("Arial", 10), fg="white", bg="black").pack(side="left")
+        self.sink_if_entry = tk.Entry(if_frame, width=15, font=("Arial", 10), fg="white", bg="#333333",
+                                      insertbackground="white")
+        self.sink_if_entry.pack(side="left", padx=5)
+
+        self.sink_status_label = tk.Label(self.sink_window, text="未启动",
+                                          font=("Arial", 10), fg="yellow", bg="black", pady=5,
+                                          justify="left", anchor="w")
+        self.sink_status_label.pack(fill="x")
+
+        self.sink_window.bind("<Button-1>", self.start_move_sink)
+        self.sink_window.bind("<B1-Motion>", self.on_motion_sink)
+        self.sink_window.protocol("WM_DELETE_WINDOW", self.close_sink_window)
+
+    def close_sink_window(self):
+        """关闭数据包接收窗口并停止接收"""
+        if self.sink_window:
+            self.stop_sink()
+            self.sink_window.destroy()
+            self.sink_window = None
+
+    def toggle_sink(self):
+        """启动或停止接收端"""
+        if self.udp_sink:
+            self.stop_sink()
+            self.sink_status_label.config(text="已停止", fg="yellow")
+            return
+        try:
+            port = int(self.sink_port_entry.get())
+            groups = [g.strip() for g in self.sink_groups_entry.get().split(",") if g.strip()]
+            for group in groups:
+                socket.inet_aton(group)
+                if target_kind(group) != "multicast":
+                    raise ValueError(f"{group} 不是组播地址")
+            interface = self.sink_if_entry.get().strip()
+            self.udp_sink = UdpSink(port, groups, interface, self.socket_tuning)
+        except (ValueError, OSError) as e:
+            self.sink_status_label.config(text=f"启动失败：{e}", fg="red")
+            return
+        self.sink_last = None
+        self.sink_snmp_base = read_udp_snmp()
+        self.sink_button.config(text="停止")
+        self.sink_status_label.config(text="等待数据...", fg="green")
+        self.schedule_sink_status()
+
+    def stop_sink(self):
+        """停止接收端"""
+        if self.sink_tick_id is not None:
+            self.after_cancel(self.sink_tick_id)
+            self.sink_tick_id = None
+        if self.udp_sink:
+            self.udp_sink.stop()
+            self.udp_sink = None
+            if self.sink_window:
+                self.sink_button.config(text="启动")
+
+    def schedule_sink_status(self):
+        """一秒后刷新接收状态（避免重复排队）"""
+        if self.sink_tick_id is not None:
+            self.after_cancel(self.sink_tick_id)
+        self.sink_tick_id = self.after(1000, self.update_sink_status)
+
+    def update_sink_status(self):
+        """每秒刷新接收速率及校验结果"""
+        self.sink_tick_id = None
+        sink = self.udp_sink
+        if sink is None or not self.sink_window:
+            return
+        now = time.monotonic()
+        received = [channel.bytes_received for channel in sink.channels]
+        if self.sink_last is not None:
+            last_time, last_received = self.sink_last
+            lines = []
+            for channel, cur, old in zip(sink.channels, received, last_received):
+                rate = (cur - old) * 8 / (1024 * 1024) / (now - last_time)
+                line = f"{channel.name}：{rate:.2f} Mbps，{channel.packets} 包"
+                if channel.verified or channel.corrupt:
+                    line += f"，丢失 {channel.lost} ({channel.loss_ratio:.2%})"
+                    if channel.duplicates:
+                        line += f"，重复 {channel.duplicates}"
+                lines.append(line)
+            if sink.verified or sink.corrupt:
+                lines.append(f"校验通过 {sink.verified}，损坏 {sink.corrupt}")
+            snmp = format_udp_snmp_delta(self.sink_snmp_base, read_udp_snmp())
+            if snmp:
+                lines.append(f"内核 {snmp}")
+            if sink.skipped_options:
+                lines.append("未生效：" + ",".join(sink.skipped_options))
+            lost = any(channel.lost for channel in sink.channels)
+            self.sink_status_label.config(text="\n".join(lines),
+                                          fg="red" if sink.corrupt else ("orange" if lost else "green"))
+        self.sink_last = (now, received)
+        self.schedule_sink_status()
+
+    def start_move_sink(self, event):
+        """记录数据包接收窗口拖动起始位置"""
+        self.sink_offset_x = event.x_root - self.sink_window.winfo_x()
+        self.sink_offset_y = event.y_root - self.sink_window.winfo_y()
+
+    def on_motion_sink(self, event):
+        """拖动数据包接收窗口"""
+        x = event.x_root - self.sink_offset_x
+        y = event.y_root - self.sink_offset_y
+        self.sink_window.geometry(f"+{x}+{y}")
 
     # -------------------- 网速显示窗口及设置 --------------------
     def open_network_window(self):
@@ -697,13 +3373,25 @@ class ClockWindow(tk.Tk):
         self.network_window.bind("<Button-3>", self.show_network_context_menu)
         self.network_window.protocol("WM_DELETE_WINDOW", self.close_network_window)
 
+        with STARTUP_TRACE.importing("psutil"):
+            import psutil
+        with STARTUP_TRACE.importing("tkinter.font"):
+            from tkinter import font
+        self.speed_font = font.Font(font=self.speed_label["font"])  # 按文字宽度调整窗口
+        self.network_sampler = AdaptiveSampler(self.network_refresh_interval, self.network_adaptive)
+        self.network_size = (net_width, net_height)
         self.old_stats = psutil.net_io_counters()
-        self.update_network()
+        self.old_stats_time = time.monotonic()
+        # 第一次采样等一个刷新间隔，间隔过短时折算出的速率没有意义
+        self.network_tick_id = self.network_window.after(self.network_refresh_interval, self.update_network)
 
     def show_network_context_menu(self, event):
         """在网速窗口右键弹出菜单"""
         menu = tk.Menu(self.network_window, tearoff=0)
         menu.add_command(label="刷新间隔设置", command=self.open_refresh_settings_window)
+        adaptive_var = tk.BooleanVar(value=self.network_adaptive)
+        menu.add_checkbutton(label="自适应采样（空闲退避/突发加速）", variable=adaptive_var,
+                             command=lambda: self.set_network_adaptive(adaptive_var.get()))
         menu.post(event.x_root, event.y_root)
 
     def open_refresh_settings_window(self):
@@ -752,12 +3440,23 @@ class ClockWindow(tk.Tk):
             if new_interval < 1:
                 raise ValueError
             self.network_refresh_interval = new_interval
+            if self.network_sampler:
+                self.network_sampler.refresh_ms = new_interval
         except ValueError:
             messagebox.showerror("错误", "请输入有效的整数（>=1）")
             return
         self.refresh_settings_window.destroy()
         self.refresh_settings_window = None
 
+    def set_network_adaptive(self, adaptive: bool):
+        """开启/关闭网速自适应采样，立即按新模式重新排定下一次采样"""
+        self.network_adaptive = adaptive
+        if self.network_sampler:
+            self.network_sampler.adaptive = adaptive
+        if self.network_window and self.network_tick_id is not None:
+            self.network_window.after_cancel(self.network_tick_id)
+            self.network_tick_id = self.network_window.after(self.network_refresh_interval, self.update_network)
+
     def show_ip(self, event):
         """延迟显示 IP 地址窗口"""
         if hasattr(self, 'show_ip_after_id'):
@@ -807,31 +3506,60 @@ class ClockWindow(tk.Tk):
         """关闭网速显示窗口"""
         if self.network_window:
             self.hide_ip(None)
+            if self.network_tick_id is not None:
+                # 退避时下一次采样可能在几秒后，重新打开窗口前必须取消，否则会出现两个采样循环
+                self.network_window.after_cancel(self.network_tick_id)
+                self.network_tick_id = None
             self.network_window.destroy()
             self.network_window = None
 
     def update_network(self):
-        """更新网速显示"""
+        """采样网速并按刷新间隔更新显示（自适应模式下采样间隔随流量变化）"""
+        self.network_tick_id = None
         if self.network_window:
+            with STARTUP_TRACE.importing("psutil"):
+                import psutil
             new_stats = psutil.net_io_counters()
-            upload_speed = (new_stats.bytes_sent - self.old_stats.bytes_sent) / 1024
-            download_speed = (new_stats.bytes_recv - self.old_stats.bytes_recv) / 1024
+            now = time.monotonic()
+            elapsed = now - self.old_stats_time
+            sent = new_stats.bytes_sent - self.old_stats.bytes_sent
+            received = new_stats.bytes_recv - self.old_stats.bytes_recv
+            recorder = self.recorder
+            if recorder and elapsed > 0:
+                # 每次采样都记录按实际间隔折算的 字节/秒，快速采样时能保留突发的细节
+                recorder.record(SessionRecorder.KIND_NETWORK, sent / elapsed, received / elapsed)
             self.old_stats = new_stats
-
-            if upload_speed >= 1024:
-                upload_speed /= 1024
-                upload_unit = "MB/s"
-            else:
-                upload_unit = "KB/s"
-
-            if download_speed >= 1024:
-                download_speed /= 1024
-                download_unit = "MB/s"
-            else:
-                download_unit = "KB/s"
-
-            self.speed_label.config(text=f"⬆ {upload_speed:.2f} {upload_unit}   ⬇ {download_speed:.2f} {download_unit}")
-            self.network_window.after(self.network_refresh_interval, self.update_network)
+            self.old_stats_time = now
+
+            delay, display = self.network_sampler.sample(now, elapsed, sent, received)
+            if display is not None:
+                self.show_network_speed(*display)
+            self.network_tick_id = self.network_window.after(delay, self.update_network)
+
+    def show_network_speed(self, upload: float, download: float, upload_peak: float, download_peak: float):
+        """显示刷新间隔内的平均网速（字节/秒）；峰值明显高于均值时一并显示，提示有短暂突发"""
+        def format_rate(rate):
+            rate /= 1024
+            if rate >= 1024:
+                return f"{rate / 1024:.2f} MB/s"
+            return f"{rate:.2f} KB/s"
+
+        def burst(average, peak):
+            return peak >= AdaptiveSampler.IDLE_THRESHOLD and peak > average * 1.5
+
+        text = f"⬆ {format_rate(upload)}"
+        if burst(upload, upload_peak):
+            text += f" (峰 {format_rate(upload_peak)})"
+        text += f"   ⬇ {format_rate(download)}"
+        if burst(download, download_peak):
+            text += f" (峰 {format_rate(download_peak)})"
+        bursting = burst(upload, upload_peak) or burst(download, download_peak)
+        self.speed_label.config(text=text, fg="orange" if bursting else "white")
+        # 显示峰值时文字变长，窗口随之加宽，恢复后缩回默认宽度
+        default_width, height = self.network_size
+        width = max(default_width, self.speed_font.measure(text) + 20)
+        if width != self.network_window.winfo_width():
+            self.network_window.geometry(f"{width}x{height}")
 
     def start_move_net(self, event):
         """记录网速窗口拖动起始位置"""
@@ -928,6 +3656,7 @@ class ClockWindow(tk.Tk):
             message = self.memory_manager.add_memory(size_mb)
             self.mem_status_label.config(text=message, fg="orange")
             self.update_mem_usage()
+            self.record_memory()
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字！")
 
@@ -941,6 +3670,7 @@ class ClockWindow(tk.Tk):
             message = self.memory_manager.reduce_memory(size_mb)
             self.mem_status_label.config(text=message, fg="orange" if "成功" in message else "red")
             self.update_mem_usage()
+            self.record_memory()
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字！")
 
@@ -949,11 +3679,88 @@ class ClockWindow(tk.Tk):
         message = self.memory_manager.reset_memory()
         self.mem_status_label.config(text=message, fg="orange")
         self.update_mem_usage()
+        self.record_memory()
+
+
+    # -------------------- 卡顿监控窗口 --------------------
+    def open_loop_window(self):
+        """打开卡顿监控悬浮窗口，并开始为所有回调计时"""
+        if self.loop_window:
+            return
+        self.loop_monitor.reset()
+        self.loop_monitor.install()
+
+        self.loop_window = tk.Toplevel(self)
+        self.loop_window.attributes('-topmost', True)
+        self.loop_window.config(bg="black")
+        self.loop_window.overrideredirect(True)
+
+        clock_x = self.winfo_x()
+        clock_y = self.winfo_y()
+        loop_width = 420
+        loop_height = 130
+        loop_x = clock_x
+        loop_y = clock_y - loop_height - 5
+        self.loop_window.geometry(f"{loop_width}x{loop_height}+{loop_x}+{max(loop_y, 5)}")
+
+        self.loop_label = tk.Label(self.loop_window, text="正在统计...",
+                                   font=("Consolas", 9), fg="white", bg="black",
+                                   justify="left", anchor="nw", padx=5, pady=5)
+        self.loop_label.pack(fill="both", expand=True)
+
+        self.loop_window.bind("<Button-1>", self.start_move_loop)
+        self.loop_window.bind("<B1-Motion>", self.on_motion_loop)
+        self.loop_window.bind("<Button-3>", self.show_loop_context_menu)
+        self.loop_window.protocol("WM_DELETE_WINDOW", self.close_loop_window)
+        self.update_loop_window()
+
+    def close_loop_window(self):
+        """关闭卡顿监控窗口并停止计时"""
+        if self.loop_window:
+            self.loop_monitor.uninstall()
+            self.loop_window.destroy()
+            self.loop_window = None
+
+    def update_loop_window(self):
+        """每秒刷新最慢的回调"""
+        if self.loop_window:
+            self.loop_label.config(text=self.loop_monitor.report(top=5))
+            self.loop_window.after(1000, self.update_loop_window)
+
+    def show_loop_context_menu(self, event):
+        """在卡顿监控窗口右键弹出菜单"""
+        menu = tk.Menu(self.loop_window, tearoff=0)
+        menu.add_command(label="导出报告", command=self.export_loop_report)
+        menu.add_command(label="清空统计", command=self.loop_monitor.reset)
+        menu.add_command(label="关闭", command=self.close_loop_window)
+        menu.post(event.x_root, event.y_root)
 
+    def export_loop_report(self):
+        """把完整的回调耗时报告导出到程序目录"""
+        folder = os.path.dirname(self.get_program_path())
+        path = os.path.join(folder, f"loop_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.loop_monitor.report())
+        except OSError as e:
+            messagebox.showerror("错误", f"无法导出报告：{e}")
+            return
+        messagebox.showinfo("提示", f"报告已导出：\n{path}")
+
+    def start_move_loop(self, event):
+        """记录卡顿监控窗口拖动起始位置"""
+        self.loop_x = event.x_root - self.loop_window.winfo_x()
+        self.loop_y = event.y_root - self.loop_window.winfo_y()
+
+    def on_motion_loop(self, event):
+        """拖动卡顿监控窗口"""
+        x = event.x_root - self.loop_x
+        y = event.y_root - self.loop_y
+        self.loop_window.geometry(f"+{x}+{y}")
 
     # -------------------- 程序退出 --------------------
     def on_closing(self):
-        """退出程序时关闭所有窗口"""
+        """退出程序时关闭所有窗口和托盘图标"""
         self.restore_sleep()
         if self.network_window:
             self.network_window.destroy()
@@ -963,12 +3770,29 @@ class ClockWindow(tk.Tk):
             self.ip_window.destroy()
         if self.packet_sender_window:
             self.close_packet_sender_window()
+        if self.sink_window:
+            self.close_sink_window()
+        if self.loop_window:
+            self.close_loop_window()
+        self.stop_profiling()
+        if self.sender_worker:
+            self.sender_worker.shutdown()
         self.memory_manager.reset_memory()
+        self.stop_recording()
+        self.ui.stop()
+        if self.tray_icon:
+            self.tray_icon.stop()  # 停止托盘图标
         self.destroy()
 
 
 if __name__ == "__main__":
+    if "--analyze" in sys.argv:
+        # 离线分析会话记录，不依赖图形界面，任何平台都可运行
+        sys.exit(analyze_main(sys.argv[sys.argv.index("--analyze") + 1:]))
+    if "--run" in sys.argv:
+        # 无人值守的测试场景，同样不依赖图形界面
+        sys.exit(run_main(sys.argv[sys.argv.index("--run") + 1:]))
     if sys.platform != "win32":
         print("此程序仅支持 Windows！")
         sys.exit(1)
-    ClockWindow()
+    ClockWindow(print_startup_trace="--startup-trace" in sys.argv)